@@ -1,9 +1,20 @@
+from functools import partial
 import logging
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
-from homeassistant.helpers.entity import DeviceInfo
+import os
 
-from .conga import Conga
+from homeassistant.core import callback
+from homeassistant.helpers import device_registry as dr
+
+from .coordinator import CongaDataUpdateCoordinator, cache_store, plans_store
+from .history import CleaningHistory, index_store, log_path
+from .ratelimit import DEFAULT_RATE
+from .registry import account_key, async_get_registry, token_store
+from .services import async_setup_services, async_unload_services
 from .const import (
+    CONF_DEVICES,
+    CONF_METRICS,
+    CONF_PUSH,
+    CONF_RATE_LIMIT,
     CONF_USERNAME,
     CONF_PASSWORD,
     DOMAIN,
@@ -11,22 +22,85 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+PLATFORMS = ["vacuum", "button", "sensor", "binary_sensor"]
+
 
 async def async_setup_entry(hass, entry):
     """Set up Cecotec Conga sensors based on a config entry."""
     _LOGGER.info("Setting up Cecotec Conga integration")
     hass.data.setdefault(DOMAIN, {})
+    if entry.unique_id is None:
+        # Entries created before accounts were unique get their account as id
+        unique_id = account_key(entry.data[CONF_USERNAME])
+        if any(
+            other.unique_id == unique_id
+            for other in hass.config_entries.async_entries(DOMAIN)
+        ):
+            _LOGGER.warning(
+                f"Entry {entry.entry_id} duplicates the entry of the same account, remove it"
+            )
+        else:
+            hass.config_entries.async_update_entry(entry, unique_id=unique_id)
 
-    conga_client = Conga(entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD])
-    await hass.async_add_executor_job(
-        conga_client.update_shadows, entry.data["devices"][0]["sn"]
+    # Clients are shared per account, keeping their tokens and connections
+    # across the config flow, reloads and other entries of the same account
+    registry = async_get_registry(hass)
+    conga_client = registry.async_acquire(
+        entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD]
+    )
+    entry.async_on_unload(partial(registry.async_release, conga_client))
+    conga_client.metrics.enabled = entry.options.get(CONF_METRICS, False)
+    conga_client.rate_limiter.configure(entry.options.get(CONF_RATE_LIMIT, DEFAULT_RATE))
+    coordinator = CongaDataUpdateCoordinator(
+        hass,
+        conga_client,
+        entry.data[CONF_DEVICES],
+        entry.options.get(CONF_PUSH, False),
+        cache_store(hass, entry.entry_id),
+        plans_store(hass, entry.entry_id),
     )
-    plans = await hass.async_add_executor_job(conga_client.list_plans)
+
+    @callback
+    def async_devices_changed(added, removed):
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_DEVICES: list(coordinator.devices)}
+        )
+        # Removing the device takes its entities along
+        device_registry = dr.async_get(hass)
+        for device in removed:
+            device_entry = device_registry.async_get_device(
+                identifiers={(DOMAIN, device["sn"])}
+            )
+            if device_entry is not None:
+                device_registry.async_remove_device(device_entry.id)
+
+    entry.async_on_unload(coordinator.add_device_listener(async_devices_changed))
+    # Entities start from the last known state and the cloud is reached in the
+    # background, only the very first setup waits for it
+    if await coordinator.async_restore():
+        hass.async_create_task(coordinator.async_refresh())
+    else:
+        await coordinator.async_config_entry_first_refresh()
+    entry.async_on_unload(
+        conga_client.add_status_listener(coordinator.async_update_from_cache)
+    )
+    coordinator.async_start_push()
+
+    history = CleaningHistory(hass, entry.entry_id, conga_client)
+    await history.async_load()
+    entry.async_on_unload(
+        coordinator.async_add_listener(lambda: history.async_observe(coordinator.data))
+    )
+    entry.async_on_unload(coordinator.async_stop)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     hass.data[DOMAIN][entry.entry_id] = {
         "controller": conga_client,
-        "devices": entry.data["devices"],
-        "plans": plans,
+        "coordinator": coordinator,
+        "history": history,
+        # Updated in place as devices are added to or removed from the account
+        "devices": coordinator.devices,
+        "options": dict(entry.options),
         "lastTimeSync": 0,
         "lastFirmwareCheck": 0,
         "latestFirmwareVersion": False,
@@ -34,16 +108,44 @@ async def async_setup_entry(hass, entry):
         "name": "test",
     }
 
-    hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, "vacuum")
-    )
-    hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, "button")
-    )
-    hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, "sensor")
-    )
-    hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, "binary_sensor")
-    )
+    for platform in PLATFORMS:
+        hass.async_create_task(
+            hass.config_entries.async_forward_entry_setup(entry, platform)
+        )
+    async_setup_services(hass)
     return True
+
+
+async def async_unload_entry(hass, entry):
+    """Unload a config entry."""
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        hass.data[DOMAIN].pop(entry.entry_id)
+        if not hass.data[DOMAIN]:
+            async_unload_services(hass)
+    return unload_ok
+
+
+async def async_reload_entry(hass, entry):
+    """Reload a config entry after its options change."""
+    # Device list updates are stored in the entry data without reloading it
+    if entry.options == hass.data[DOMAIN][entry.entry_id]["options"]:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_remove_entry(hass, entry):
+    """Remove the data stored for a config entry."""
+    key = account_key(entry.data[CONF_USERNAME])
+    if not any(
+        account_key(other.data[CONF_USERNAME]) == key
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        await token_store(hass, entry.data[CONF_USERNAME]).async_remove()
+    await index_store(hass, entry.entry_id).async_remove()
+    await cache_store(hass, entry.entry_id).async_remove()
+    await plans_store(hass, entry.entry_id).async_remove()
+    path = log_path(hass, entry.entry_id)
+    if await hass.async_add_executor_job(os.path.exists, path):
+        await hass.async_add_executor_job(os.remove, path)
@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import logging
+import time
+from functools import partial
+
+import aiohttp
+
+from .conga import (
+    AWS_IOT_ENDPOINT,
+    AWS_REGION,
+    CECOTEC_API_BASE_URL,
+    CongaBase,
+)
+from .commands import CommandQueue
+from .encoding import dumps, loads
+from .resilience import CongaUnavailableError, RequestGuard
+from .sigv4 import sign_request
+from .stats import CommandStats, ConnectionStats
+from .tokens import CongaAuthError, CongaTokenManager
+
+_LOGGER = logging.getLogger(__name__)
+
+IOT_DATA_SERVICE = "iotdata"
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30)
+# Seconds idle connections are kept open for reuse
+KEEPALIVE_TIMEOUT = 120
+# Devices whose shadows are fetched, or commands are sent, at the same time
+MAX_CONCURRENT_DEVICES = 8
+
+# Errors a request to the Conga cloud is expected to fail with
+REQUEST_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    CongaAuthError,
+    CongaUnavailableError,
+)
+
+
+class AsyncConga(CongaBase):
+    """Asyncio version of Conga, talking to the cloud through aiohttp."""
+
+    def __init__(self, username, password, session=None, store=None, metrics=False):
+        super().__init__(username, password)
+        self.metrics.enabled = metrics
+        self.stats = ConnectionStats()
+        self.command_stats = CommandStats()
+        # Entities follow the availability of the cloud, notify them on changes
+        self._guard = RequestGuard(partial(self._notify_status, None))
+        self.resilience_stats = self._guard.stats
+        self._command_queues = {}
+        self._devices_etag = None
+        self._devices_hash = None
+        self._session = session
+        self._owns_session = session is None
+        self._tokens = CongaTokenManager(
+            username, password, self._get_session, store, self.stats, self.metrics
+        )
+
+    async def close(self):
+        self._tokens.close()
+        for queue in self._command_queues.values():
+            queue.close()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def available(self):
+        """Return False while requests are paused after repeated failures."""
+        return self._guard.available
+
+    async def list_vacuums(self):
+        """Fetch the devices of the account.
+
+        The same list object is returned for as long as the devices do not
+        change, so callers can tell a changed list with an identity check.
+        """
+        await self._guard.async_call(self._list_vacuums)
+        return self._devices
+
+    async def _list_vacuums(self):
+        await self.rate_limiter.async_acquire()
+        id_token = await self._tokens.async_get_id_token()
+        headers = {"Authorization": id_token}
+        if self._devices_etag is not None:
+            headers["If-None-Match"] = self._devices_etag
+        with self.metrics.timer("list_vacuums"):
+            async with self._get_session().post(
+                f"{CECOTEC_API_BASE_URL}/api/user_machine/list",
+                json={},
+                headers=headers,
+            ) as response:
+                if response.status == 304:
+                    return
+                response.raise_for_status()
+                self._devices_etag = response.headers.get("ETag")
+                payload = await response.read()
+
+        # Without an ETag, an unchanged list is told by the hash of its body
+        devices_hash = hashlib.sha1(payload).hexdigest()
+        if devices_hash == self._devices_hash:
+            return
+        self._devices = loads(payload)["data"]["page_items"]
+        self._devices_hash = devices_hash
+        _LOGGER.debug(f"Devices of the account: {self._devices}")
+
+    async def update_shadows(self, sn, max_age=None):
+        """Fetch the shadows of a device and return its reported state.
+
+        When `max_age` (in seconds) is given and the cached shadows of `sn`
+        are younger than that, the cached state is returned without fetching.
+        """
+        cache = self._get_cached_shadows(sn, max_age)
+        if cache is not None:
+            return cache.reported
+
+        shadow, shadow_service = await asyncio.gather(
+            self._get_thing_shadow(sn), self._get_thing_shadow(sn, "service")
+        )
+        return self._store_shadows(sn, shadow, shadow_service)
+
+    async def update_all_shadows(self, sns, max_age=None):
+        """Fetch the shadows of several devices concurrently.
+
+        Returns a tuple with the reported state of every device that could be
+        fetched and the error raised for every device that could not, both
+        keyed by serial number.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DEVICES)
+        results = {}
+        errors = {}
+
+        async def _update(sn):
+            async with semaphore:
+                try:
+                    results[sn] = await self.update_shadows(sn, max_age)
+                except REQUEST_ERRORS as err:
+                    errors[sn] = err
+
+        await asyncio.gather(*(_update(sn) for sn in sns))
+        return results, errors
+
+    async def run_all(self, sns, command):
+        """Await `command(sn)` for several devices concurrently.
+
+        Returns, keyed by serial number, whether the command succeeded, the
+        seconds it took and the error it failed with, if any.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DEVICES)
+        results = {}
+
+        async def _run(sn):
+            async with semaphore:
+                start = time.monotonic()
+                error = None
+                try:
+                    await command(sn)
+                except REQUEST_ERRORS as err:
+                    error = str(err) or repr(err)
+                results[sn] = {
+                    "success": error is None,
+                    "latency": round(time.monotonic() - start, 3),
+                    "error": error,
+                }
+
+        await asyncio.gather(*(_run(sn) for sn in sns))
+        return results
+
+    async def get_iot_credentials(self):
+        """Return the temporary AWS credentials of the account."""
+        return await self._tokens.async_get_credentials()
+
+    async def get_identity_id(self):
+        """Return the Cognito identity id of the account."""
+        await self._tokens.async_get_credentials()
+        return self._tokens.identity_id
+
+    async def start(self, sn, fan_speed):
+        self._started_plans.pop(sn, None)
+        await self._send_payload(sn, self._start_payload(fan_speed))
+
+    async def set_fan_speed(self, sn, level):
+        await self._send_command(sn, self._fan_speed_payload(level))
+
+    async def set_water_level(self, sn, level):
+        await self._send_command(sn, self._water_level_payload(level))
+
+    async def start_plan(self, sn, plan_name):
+        _LOGGER.info(f"Starting plan {plan_name} on {sn}")
+        if sn not in self._shadows:
+            await self.update_shadows(sn)
+        payload = self._start_plan_payload(self._get_plan_details(sn, plan_name))
+        self._started_plans[sn] = plan_name
+        await self._send_payload(sn, payload)
+
+    async def home(self, sn):
+        await self._send_payload(sn, self._home_payload())
+
+    async def _send_payload(self, sn, payload):
+        await self._send_command(sn, payload, "service")
+
+    async def _send_command(self, sn, payload, shadow_name=None):
+        """Send a command through the queue of `sn`, showing its effect right away.
+
+        Setting changes of the classic shadow are merged with the ones sent
+        shortly after them, actions are sent as they come.
+        """
+        queue = self._command_queues.get(sn)
+        if queue is None:
+            queue = CommandQueue(partial(self._update_desired, sn), self.command_stats)
+            self._command_queues[sn] = queue
+
+        desired = payload["state"]["desired"]
+        self._apply_optimistic(sn, desired)
+        try:
+            if shadow_name is None:
+                await queue.async_set(desired)
+            else:
+                await queue.async_run(shadow_name, desired)
+        except REQUEST_ERRORS:
+            self._discard_optimistic(sn)
+            raise
+
+    async def _update_desired(self, sn, shadow_name, desired):
+        await self._update_thing_shadow(sn, {"state": {"desired": desired}}, shadow_name)
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(keepalive_timeout=KEEPALIVE_TIMEOUT),
+                timeout=REQUEST_TIMEOUT,
+                trace_configs=[self.stats.trace_config()],
+            )
+        return self._session
+
+    async def _get_thing_shadow(self, sn, shadow_name=None):
+        return await self._iot_request("GET", sn, shadow_name)
+
+    async def _update_thing_shadow(self, sn, payload, shadow_name=None):
+        _LOGGER.debug(payload)
+        return await self._iot_request("POST", sn, shadow_name, dumps(payload))
+
+    async def _iot_request(self, method, sn, shadow_name=None, body=b""):
+        # Shadow updates are not retried when the cloud may have applied them
+        return await self._guard.async_call(
+            partial(self._iot_request_once, method, sn, shadow_name, body),
+            idempotent=method == "GET",
+        )
+
+    async def _iot_request_once(self, method, sn, shadow_name, body):
+        # Waiting comes first, so the request is signed with fresh credentials
+        await self.rate_limiter.async_acquire()
+        credentials = await self._tokens.async_get_credentials()
+        url = f"{AWS_IOT_ENDPOINT}/things/{sn}/shadow"
+        if shadow_name is not None:
+            url = f"{url}?name={shadow_name}"
+
+        headers = sign_request(
+            method,
+            url,
+            AWS_REGION,
+            IOT_DATA_SERVICE,
+            credentials["AccessKeyId"],
+            credentials["SecretKey"],
+            credentials["SessionToken"],
+            body=body,
+        )
+        # Only the round trip is timed, waits and backoffs are not part of it
+        operation = "get_shadow" if method == "GET" else "update_shadow"
+        with self.metrics.timer(operation, sn):
+            async with self._get_session().request(
+                method, url, data=body or None, headers=headers
+            ) as response:
+                response.raise_for_status()
+                return await response.read()
@@ -1,17 +1,14 @@
-from datetime import timedelta
 import logging
-from homeassistant.util import Throttle
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.components.binary_sensor import BinarySensorEntity, BinarySensorDeviceClass
 from homeassistant.helpers.entity import DeviceInfo, Entity
 from homeassistant.const import (
     AREA_SQUARE_METERS,
     UnitOfTime,    
 )
-from requests import HTTPError
 
 from .button import CongaEntity
-from .utils import build_device_info
+from .utils import async_track_reported_keys, build_device_info
 from .const import (
     BRAND,
     CONF_DEVICES,
@@ -19,10 +16,9 @@ from .const import (
     MODEL,
 )
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(seconds=60)
-
 _LOGGER = logging.getLogger(__name__)
 
+# Binary sensors of the reported shadow keys, created once a device reports the key
 binary_sensors = [
     {
         "id": "connected",
@@ -33,19 +29,21 @@ binary_sensors = [
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the Cecotec Conga sensor from a config entry."""
-    entities = []
-
-    devices = hass.data[DOMAIN][config_entry.entry_id]["devices"]
+    conga_data = hass.data[DOMAIN][config_entry.entry_id]
+    descriptors = {sensor["id"]: sensor for sensor in binary_sensors}
 
-    for device in devices:
-        conga_data = hass.data[DOMAIN][config_entry.entry_id]
-        for sensor in binary_sensors:
-            sensor_entity = CongaVacuumBinarySensor(
-                hass, conga_data, device["sn"], device["note_name"], sensor
-            )
-            entities.append(sensor_entity)
+    @callback
+    def async_add_keys(device, keys):
+        async_add_entities(
+            [
+                CongaVacuumBinarySensor(
+                    hass, conga_data, device["sn"], device["note_name"], descriptors[key]
+                )
+                for key in keys
+            ]
+        )
 
-    async_add_entities(entities, update_before_add=True)
+    async_track_reported_keys(config_entry, conga_data, list(descriptors), async_add_keys)
 
 
 
@@ -70,6 +68,7 @@ class CongaVacuumBinarySensor(BinarySensorEntity, CongaEntity):
         self._unique_id = f"{self._device_name}_{sensor['id']}"
         CongaEntity.__init__(self, conga_data, device_name, sn)
         BinarySensorEntity.__init__(self)
+        self._update_from_data()
 
     @property
     def name(self):
@@ -88,16 +87,15 @@ class CongaVacuumBinarySensor(BinarySensorEntity, CongaEntity):
     def device_class(self) -> str:
         return self._device_class
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Get the next bus information."""
-        try:
-            state_all = self._conga_client.get_status()
-
-            if self._attribute_id in ["cleanTime", "allTime"]:
-                self._state = round(state_all[self._attribute_id] / 60)
-            else:
-                self._state = state_all[self._attribute_id]
-
-        except HTTPError:
-            _LOGGER.error("Unable to fetch data from API")
+    def _update_from_data(self):
+        state_all = self.device_data.get("status", {})
+        if self._attribute_id in state_all:
+            self._state = state_all[self._attribute_id]
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if not self.device_changed((self._attribute_id,)):
+            return
+        self._update_from_data()
+        self.async_write_state_if_changed()
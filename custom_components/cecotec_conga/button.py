@@ -1,7 +1,9 @@
 import logging
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.components.button import ButtonEntity
-from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .utils import build_device_info
 from .const import (
@@ -16,31 +18,61 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the Cecotec Conga sensor from a config entry."""
-    entities = []
+    conga_data = hass.data[DOMAIN][config_entry.entry_id]
+    conga_client = conga_data["controller"]
+    buttons = {}
+
+    def device_name(sn):
+        for device in conga_data["devices"]:
+            if device["sn"] == sn:
+                return device["note_name"]
+        return None
+
+    @callback
+    def async_update_buttons(sn, added, removed):
+        name = device_name(sn)
+        if name is None:
+            return
+
+        entities = []
+        for plan in added:
+            if (sn, plan) in buttons:
+                continue
+            button = CongaVacuumPlanButton(hass, conga_data, plan, sn, name)
+            buttons[(sn, plan)] = button
+            entities.append(button)
+        if entities:
+            async_add_entities(entities)
 
-    devices = hass.data[DOMAIN][config_entry.entry_id]["devices"]
-    plans = hass.data[DOMAIN][config_entry.entry_id]["plans"]
+        registry = er.async_get(hass)
+        for plan in removed:
+            button = buttons.pop((sn, plan), None)
+            if button is None:
+                continue
+            _LOGGER.info(f"Plan {plan} removed from {name}, removing its button")
+            if button.registry_entry is not None:
+                registry.async_remove(button.entity_id)
+            else:
+                hass.async_create_task(button.async_remove())
 
-    for device in devices:
-        for plan in plans:
-            conga_data = hass.data[DOMAIN][config_entry.entry_id]
-            button = CongaVacuumPlanButton(
-                hass, conga_data, plan, device["sn"], device["note_name"]
-            )
-            entities.append(button)
-            # hass.data[DOMAIN][config_entry.entry_id]["entities"].append(button)
+    for device in conga_data["devices"]:
+        async_update_buttons(device["sn"], conga_client.list_plans(device["sn"]), [])
 
-    async_add_entities(entities, update_before_add=True)
+    # Buttons follow the plans found by the coordinator refreshes
+    config_entry.async_on_unload(conga_client.add_plan_listener(async_update_buttons))
 
 
-class CongaEntity(Entity):
+class CongaEntity(CoordinatorEntity):
     def __init__(
         self,
         conga_data: dict,
         device_name: str,
         sn: str,
     ):
+        CoordinatorEntity.__init__(self, conga_data["coordinator"])
         self._enabled = False
+        # Availability and snapshot of the state last written
+        self._written = None
         self._device_name = device_name
         self._conga_data = conga_data
         self._conga_client = conga_data["controller"]
@@ -58,10 +90,47 @@ class CongaEntity(Entity):
     def brand(self):
         return BRAND
 
+    @property
+    def available(self) -> bool:
+        return super().available and self._conga_client.available
+
+    @property
+    def device_data(self) -> dict:
+        """Return the latest data fetched by the coordinator for this device."""
+        return self.coordinator.data.get(self._sn, {})
+
+    def device_changed(self, keys) -> bool:
+        """Return whether any of `keys` changed in the last coordinator update.
+
+        A change of availability since the state was last written counts too.
+        """
+        if self._written is not None and self._written[0] != self.available:
+            return True
+        changed = self.coordinator.changed.get(self._sn)
+        return changed is None or not changed.isdisjoint(keys)
+
+    def state_snapshot(self):
+        """Return the values the state written for the entity is made of."""
+        return (self.state, self.extra_state_attributes)
+
+    @callback
+    def async_write_state_if_changed(self) -> None:
+        """Write the state of the entity unless it is the one written last.
+
+        Skipping identical states keeps them out of the recorder.
+        """
+        written = (self.available, self.state_snapshot())
+        if written == self._written:
+            return
+        self._written = written
+        self.async_write_ha_state()
+
     async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
         self._enabled = True
 
     async def async_will_remove_from_hass(self) -> None:
+        await super().async_will_remove_from_hass()
         self._enabled = False
 
 
@@ -94,8 +163,11 @@ class CongaVacuumPlanButton(ButtonEntity, CongaEntity):
     def unique_id(self) -> str:
         return self._unique_id
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Only the availability of a plan button follows the coordinator."""
+        self.async_write_state_if_changed()
+
     async def async_press(self) -> None:
         _LOGGER.info(f"Running plan {self._plan_name} on {self._device_name}")
-        await self._hass.async_add_executor_job(
-            self._conga_client.start_plan, self._sn, self._plan_name
-        )
+        await self._conga_client.start_plan(self._sn, self._plan_name)
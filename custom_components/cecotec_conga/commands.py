@@ -0,0 +1,105 @@
+"""Per-device queue merging the shadow updates sent to a robot."""
+import asyncio
+import logging
+import time
+
+from .resilience import CongaUnavailableError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds setting changes wait for more changes before being sent together
+COMMAND_WINDOW = 0.3
+
+
+class CommandQueue:
+    """Send the shadow updates of one device in order, merging setting changes.
+
+    Settings, desired fragments of the classic shadow such as `workNoisy` or
+    `water`, wait `window` seconds for further changes and are sent as a
+    single update. Actions are sent right away, after any pending settings.
+    `send(shadow_name, desired)` is the coroutine doing the shadow update.
+    """
+
+    def __init__(self, send, stats=None, window=COMMAND_WINDOW):
+        self._send = send
+        self._stats = stats
+        self._window = window
+        self._lock = asyncio.Lock()
+        self._pending = {}
+        self._waiters = []
+        self._timer = None
+        self._flush_task = None
+
+    def close(self):
+        """Stop sending, failing the setting changes still waiting to be sent."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        waiters = self._waiters
+        self._pending, self._waiters = {}, []
+        _fail(waiters, CongaUnavailableError("Conga client closed"))
+
+    async def async_set(self, desired):
+        """Queue setting changes and wait until they have been sent."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.update(desired)
+        self._waiters.append((future, time.monotonic()))
+        if self._timer is None:
+            self._timer = loop.call_later(self._window, self._start_flush)
+        await future
+
+    async def async_run(self, shadow_name, desired):
+        """Send an action once the settings queued before it are sent."""
+        start = time.monotonic()
+        async with self._lock:
+            await self._send_pending()
+            await self._send(shadow_name, desired)
+        if self._stats is not None:
+            self._stats.record_batch([time.monotonic() - start])
+
+    def _start_flush(self):
+        self._timer = None
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        async with self._lock:
+            await self._send_pending()
+        self._flush_task = None
+
+    async def _send_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        desired, waiters = self._pending, self._waiters
+        self._pending, self._waiters = {}, []
+        if len(waiters) > 1:
+            _LOGGER.debug(f"Sending {len(waiters)} setting changes at once: {desired}")
+        try:
+            await self._send(None, desired)
+        except asyncio.CancelledError:
+            _fail(waiters, CongaUnavailableError("Sending the settings was cancelled"))
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            # Callers get the error, the queue keeps going with later commands
+            _fail(waiters, err)
+            return
+
+        now = time.monotonic()
+        if self._stats is not None:
+            self._stats.record_batch([now - queued_at for _, queued_at in waiters])
+        for future, _ in waiters:
+            if not future.done():
+                future.set_result(None)
+
+
+def _fail(waiters, err):
+    for future, _ in waiters:
+        if not future.done():
+            future.set_exception(err)
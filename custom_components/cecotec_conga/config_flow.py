@@ -1,19 +1,23 @@
 """Config flow for Cecotec Conga."""
 import logging
 
-from requests.models import HTTPError
-from .conga import Conga
 import voluptuous as vol
 
 from homeassistant import config_entries
+from homeassistant.core import callback
 
 from .const import (
     CONF_DEVICES,
+    CONF_METRICS,
+    CONF_PUSH,
+    CONF_RATE_LIMIT,
     CONF_USERNAME,
     CONF_PASSWORD,
     DOMAIN,
     STEP_LOGIN,
 )
+from .ratelimit import DEFAULT_RATE, MIN_RATE
+from .registry import account_key, async_get_registry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,6 +31,12 @@ class CecotecCongaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Init."""
         pass
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return CecotecCongaOptionsFlow(config_entry)
+
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
         return await self.async_step_login()
@@ -36,10 +46,15 @@ class CecotecCongaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         if user_input is not None:
+            await self.async_set_unique_id(account_key(user_input[CONF_USERNAME]))
+            self._abort_if_unique_id_configured()
+            # Validate credentials, the setup of the entry reuses the logged in client
+            registry = async_get_registry(self.hass)
+            c = registry.async_acquire(
+                user_input[CONF_USERNAME], user_input[CONF_PASSWORD]
+            )
             try:
-                # Validate credentials
-                c = Conga(user_input[CONF_USERNAME], user_input[CONF_PASSWORD])
-                vacuums = await self.hass.async_add_executor_job(c.list_vacuums)
+                vacuums = await c.list_vacuums()
 
                 # Create devices
                 return self.async_create_entry(
@@ -53,6 +68,8 @@ class CecotecCongaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
             except:
                 errors["base"] = "auth_error"
+            finally:
+                registry.async_release(c)
 
         return self.async_show_form(
             step_id=STEP_LOGIN,
@@ -64,3 +81,34 @@ class CecotecCongaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             ),
             errors=errors,
         )
+
+
+class CecotecCongaOptionsFlow(config_entries.OptionsFlow):
+    """Cecotec Conga options flow."""
+
+    def __init__(self, config_entry) -> None:
+        """Init."""
+        self._entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_PUSH, default=self._entry.options.get(CONF_PUSH, False)
+                    ): bool,
+                    vol.Optional(
+                        CONF_METRICS, default=self._entry.options.get(CONF_METRICS, False)
+                    ): bool,
+                    vol.Optional(
+                        CONF_RATE_LIMIT,
+                        default=self._entry.options.get(CONF_RATE_LIMIT, DEFAULT_RATE),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=MIN_RATE)),
+                }
+            ),
+        )
@@ -1,76 +1,423 @@
+import hashlib
 import logging
+import os
 import random
-import requests
+import re
 import string
 import json
-import boto3
-import datetime
-from pycognito import Cognito
-from pycognito.utils import RequestsSrpAuth
+import time
+
+from .encoding import loads
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .stats import ShadowStats
 
 _LOGGER = logging.getLogger(__name__)
 
-CECOTEC_API_BASE_URL = "https://qafbskf2ug.execute-api.eu-west-2.amazonaws.com"
-AWS_IOT_ENDPOINT = "https://a39k27k2ztga9m-ats.iot.eu-west-2.amazonaws.com"
+# Both can be overridden to talk to a local stand-in such as tools/mock_cloud.py
+CECOTEC_API_BASE_URL = os.environ.get(
+    "CECOTEC_API_BASE_URL", "https://qafbskf2ug.execute-api.eu-west-2.amazonaws.com"
+)
+AWS_IOT_ENDPOINT = os.environ.get(
+    "AWS_IOT_ENDPOINT", "https://a39k27k2ztga9m-ats.iot.eu-west-2.amazonaws.com"
+)
+AWS_REGION = "eu-west-2"
+COGNITO_USER_POOL_ID = "eu-west-2_L5T0M5yrf"
+COGNITO_CLIENT_ID = "6iep27ce22ojt8bgb2vji3d387"
+COGNITO_IDENTITY_POOL_ID = "eu-west-2:0cdeb155-55bb-45f8-9710-4895bd40d605"
+COGNITO_LOGIN_PROVIDER = f"cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
+# Seconds optimistic state is shown while the reported shadow disagrees with it
+OPTIMISTIC_TIMEOUT = 30
+# AWS IoT ends shadow documents with their version and timestamp
+SHADOW_VERSION_PATTERN = re.compile(rb'"version"\s*:\s*(\d+)')
+SHADOW_VERSION_TAIL = 100
+# Desired settings reported back under the same key once applied
+OPTIMISTIC_SETTINGS = ["workNoisy", "water"]
+# Reported state expected once the robot acts on a desired action
+OPTIMISTIC_ACTIONS = {
+    "startClean": {"mode": "sweep"},
+    "StartTimedCleanTask": {"mode": "sweep"},
+    "startFindCharge": {"mode": "backcharge"},
+}
+
+
+def shadow_version(payload):
+    """Return the version of a raw shadow document without parsing it."""
+    versions = SHADOW_VERSION_PATTERN.findall(payload[-SHADOW_VERSION_TAIL:])
+    if not versions:
+        return None
+    return int(versions[-1])
+
+
+def hash_tactics(tactics):
+    """Return a content hash of a raw timeTactics string."""
+    return hashlib.sha1(tactics.encode("utf-8")).hexdigest()
+
+
+class PlanIndex:
+    """Plans of a device keyed by name, parsed from a timeTactics string."""
+
+    def __init__(self, tactics, tactics_hash=None):
+        self.tactics_hash = tactics_hash or hash_tactics(tactics)
+        self.plans = {}
+        for tactic in loads(tactics)["value"]:
+            if "planName" in tactic:
+                self.plans[tactic["planName"]] = tactic
+        self.names = list(self.plans)
+
+    def get(self, plan_name):
+        return self.plans.get(plan_name)
+
+    def __contains__(self, plan_name):
+        return plan_name in self.plans
+
+
+class ShadowCache:
+    """Shadows and plans last fetched for a single device.
+
+    The service shadow can be given as its raw document, which is decoded
+    the first time it is used, and tactics are parsed the first time plans
+    are. They are only parsed again when their content hash differs from
+    the one of `plan_index`, which is reused otherwise. Parsing them is
+    timed as the `index_plans` operation of `metrics` for device `sn`.
+    """
+
+    def __init__(
+        self,
+        reported,
+        service,
+        plan_index=None,
+        versions=(None, None),
+        metrics=None,
+        sn=None,
+    ):
+        self.reported = reported
+        # Reported state of the service shadow, or its raw document until decoded
+        self.raw_service = service
+        self.version, self.service_version = versions
+        self.fetched_at = time.monotonic()
+        self._plan_index = None
+        self._previous_plan_index = plan_index
+        self._metrics = metrics or Metrics()
+        self._sn = sn
+
+    @property
+    def service(self):
+        if isinstance(self.raw_service, bytes):
+            self.raw_service = loads(self.raw_service)["state"]["reported"]
+        return self.raw_service
+
+    @property
+    def tactics(self):
+        return self.service["getTimeTactics"]["body"]["timeTactics"]
+
+    @property
+    def plan_index(self):
+        if self._plan_index is None:
+            tactics = self.tactics
+            tactics_hash = hash_tactics(tactics)
+            previous = self._previous_plan_index
+            if previous is not None and previous.tactics_hash == tactics_hash:
+                self._plan_index = previous
+            else:
+                with self._metrics.timer("index_plans", self._sn):
+                    self._plan_index = PlanIndex(tactics, tactics_hash)
+            self._previous_plan_index = None
+        return self._plan_index
+
+    def has_service(self, service, service_version):
+        """Return whether `service` is the service document of this cache."""
+        if service is self.raw_service:
+            return True
+        return service_version is not None and service_version == self.service_version
 
+    def keep_service(self, previous):
+        """Take the decoded service and plan index of `previous`.
+
+        Only valid when both caches hold the same service document, the
+        tactics are then not hashed again.
+        """
+        self.raw_service = previous.raw_service
+        self._plan_index = previous._plan_index
+
+    @property
+    def known_plan_index(self):
+        """Return the plan index last computed, without computing one."""
+        return self._plan_index or self._previous_plan_index
+
+    @property
+    def plan_names(self):
+        return self.plan_index.names
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+    def is_stale(self, ttl):
+        return self.age() >= ttl
+
+
+class CongaBase:
+    """Device cache and shadow payloads shared by the sync and async clients."""
 
-class Conga:
     def __init__(self, username, password):
         self._username = username
         self._password = password
+        self.shadow_stats = ShadowStats()
+        # Disabled unless latency metrics are turned on in the options
+        self.metrics = Metrics()
+        # Shared by polls and commands, all the requests of the account
+        self.rate_limiter = RateLimiter(metrics=self.metrics)
         self._devices = []
-        self._shadow = {}
-        self._tactics = {}
-        self._api_token = None
-        self._iot_client = None
-        self._iot_token_expiration = None
-
-    def list_vacuums(self):
-        self._refresh_api_token()
-        devices = requests.post(
-            f"{CECOTEC_API_BASE_URL}/api/user_machine/list",
-            json={},
-            auth=self._api_token,
-        )
-        devices.raise_for_status()
-        self._devices = devices.json()["data"]["page_items"]
-        _LOGGER.warn(self._devices)
-        return self._devices
-
-    def list_plans(self):
-        return self._plan_names
-
-    def update_shadows(self, sn):
-        self._refresh_iot_client()
-        shadow = self._iot_client.get_thing_shadow(thingName=sn)
-        shadow_service = self._iot_client.get_thing_shadow(
-            thingName=sn, shadowName="service"
-        )
+        self._shadows = {}
+        self._optimistic = {}
+        self._started_plans = {}
+        self._plan_listeners = []
+        self._status_listeners = []
 
-        shadow = json.load(shadow["payload"])["state"]["reported"]
-        shadow_service = json.load(shadow_service["payload"])["state"]["reported"]
+    def add_plan_listener(self, listener):
+        """Call `listener(sn, added, removed)` whenever the plans of a device change.
 
-        self._shadow = shadow
-        self._tactics = shadow_service["getTimeTactics"]["body"]["timeTactics"]
+        `added` and `removed` are lists of plan names. Every plan of a device
+        is reported as added the first time its shadows are stored. Returns a
+        function removing the listener.
+        """
+        self._plan_listeners.append(listener)
+        return lambda: self._plan_listeners.remove(listener)
 
-        # Fill plans variables
-        plans = []
-        plan_names = []
-        for tactic in json.loads(self._tactics)["value"]:
-            if "planName" in tactic:
-                plans.append(tactic)
-                plan_names.append(tactic["planName"])
+    def add_status_listener(self, listener):
+        """Call `listener(sn)` whenever optimistic state of a device changes.
 
-        self._plans = plans
-        self._plan_names = plan_names
+        Returns a function removing the listener.
+        """
+        self._status_listeners.append(listener)
+        return lambda: self._status_listeners.remove(listener)
 
-        return self._shadow
+    def list_plans(self, sn):
+        cache = self._shadows.get(sn)
+        if cache is None:
+            return []
+        return cache.plan_names
+
+    def get_plan(self, sn, plan_name):
+        cache = self._shadows.get(sn)
+        if cache is None:
+            return None
+        return cache.plan_index.get(plan_name)
+
+    def export_shadows(self, sns):
+        """Return the cached reported states of `sns`, as restore_shadows takes them."""
+        shadows = {}
+        for sn in sns:
+            cache = self._shadows.get(sn)
+            if cache is not None:
+                shadows[sn] = {"reported": cache.reported, "version": cache.version}
+        return shadows
+
+    def export_tactics(self, sns):
+        """Return the cached plans of `sns`, as restore_shadows takes them.
+
+        Only the raw timeTactics string is kept of the service shadow, which
+        is decoded if it was not yet.
+        """
+        tactics = {}
+        for sn in sns:
+            cache = self._shadows.get(sn)
+            if cache is not None:
+                tactics[sn] = {"tactics": cache.tactics, "version": cache.service_version}
+        return tactics
+
+    def service_versions(self, sns):
+        """Return the version of the cached service shadow of each of `sns`."""
+        return {
+            sn: self._shadows[sn].service_version for sn in sns if sn in self._shadows
+        }
+
+    def restore_shadows(self, shadows, tactics):
+        """Cache states and plans exported by export_shadows and export_tactics.
+
+        Devices with cached shadows are left alone, and restored shadows are
+        always stale so `max_age` never serves them. Returns the serial numbers
+        of the restored devices.
+        """
+        restored = []
+        for sn, shadow in shadows.items():
+            if sn in self._shadows or sn not in tactics:
+                continue
+            try:
+                service = {
+                    "getTimeTactics": {"body": {"timeTactics": tactics[sn]["tactics"]}}
+                }
+                self._set_shadows(
+                    sn,
+                    shadow["reported"],
+                    service,
+                    (shadow["version"], tactics[sn]["version"]),
+                )
+                self._shadows[sn].plan_index
+            except (KeyError, TypeError, ValueError):
+                _LOGGER.debug(f"Ignoring malformed saved shadows of {sn}")
+                self._shadows.pop(sn, None)
+                continue
+            self._shadows[sn].fetched_at = float("-inf")
+            restored.append(sn)
+        return restored
 
-    def get_status(self):
-        return self._shadow
+    def pop_started_plan(self, sn):
+        """Return the plan last started on `sn` by this client, forgetting it."""
+        return self._started_plans.pop(sn, None)
 
-    def start(self, sn, fan_speed):
-        payload = {
+    def get_status(self, sn):
+        """Return the reported state of `sn` with pending optimistic changes.
+
+        Optimistic values are dropped once the reported state matches them,
+        or after OPTIMISTIC_TIMEOUT seconds if it never does.
+        """
+        cache = self._shadows.get(sn)
+        if cache is None:
+            return {}
+        optimistic = self._optimistic.get(sn)
+        if not optimistic:
+            return cache.reported
+
+        now = time.monotonic()
+        status = dict(cache.reported)
+        for key, (value, expires_at) in list(optimistic.items()):
+            if status.get(key) == value or expires_at <= now:
+                del optimistic[key]
+            else:
+                status[key] = value
+        return status
+
+    def apply_shadow_update(self, sn, shadow_name, reported, version=None):
+        """Replace the cached reported state of one shadow of `sn`.
+
+        Returns False when nothing changed, either because nothing has been
+        fetched yet for `sn` (the cache needs both shadows to be usable) or
+        because `version` is not newer than the cached one.
+        """
+        cache = self._shadows.get(sn)
+        if cache is None:
+            return False
+
+        if shadow_name is None:
+            if not self._is_newer(version, cache.version):
+                return False
+            self._set_shadows(
+                sn, reported, cache.raw_service, (version, cache.service_version)
+            )
+        else:
+            if not self._is_newer(version, cache.service_version):
+                return False
+            self._set_shadows(sn, cache.reported, reported, (cache.version, version))
+        return True
+
+    @staticmethod
+    def _is_newer(version, cached_version):
+        return version is None or cached_version is None or version > cached_version
+
+    def _apply_optimistic(self, sn, desired):
+        expected = {key: desired[key] for key in OPTIMISTIC_SETTINGS if key in desired}
+        for action, state in OPTIMISTIC_ACTIONS.items():
+            if action in desired:
+                expected.update(state)
+        if not expected:
+            return
+
+        expires_at = time.monotonic() + OPTIMISTIC_TIMEOUT
+        optimistic = self._optimistic.setdefault(sn, {})
+        for key, value in expected.items():
+            optimistic[key] = (value, expires_at)
+        self._notify_status(sn)
+
+    def _discard_optimistic(self, sn):
+        if self._optimistic.pop(sn, None):
+            self._notify_status(sn)
+
+    def _notify_status(self, sn):
+        for listener in list(self._status_listeners):
+            listener(sn)
+
+    def _get_cached_shadows(self, sn, max_age):
+        cache = self._shadows.get(sn)
+        if max_age is not None and cache is not None and not cache.is_stale(max_age):
+            return cache
+        return None
+
+    def _store_shadows(self, sn, payload, service_payload):
+        """Store the raw shadow documents of `sn` and return its reported state.
+
+        Documents whose version matches the cached one are not parsed again,
+        and when neither changed the cache is kept as it is.
+        """
+        cache = self._shadows.get(sn)
+        with self.metrics.timer("parse_shadow", sn):
+            reported, version = self._parse_shadow(
+                payload, cache and cache.version, cache and cache.reported
+            )
+            # Plans are the bulk of the service shadow, it is decoded when they are needed
+            service, service_version = self._parse_shadow(
+                service_payload,
+                cache and cache.service_version,
+                cache and cache.raw_service,
+                decode=False,
+            )
+        if (
+            cache is not None
+            and reported is cache.reported
+            and service is cache.raw_service
+        ):
+            cache.fetched_at = time.monotonic()
+            self.shadow_stats.skipped += 1
+            return reported
+
+        self.shadow_stats.processed += 1
+        self._set_shadows(sn, reported, service, (version, service_version))
+        return reported
+
+    @staticmethod
+    def _parse_shadow(payload, cached_version, cached_reported, decode=True):
+        version = shadow_version(payload)
+        if version is not None and version == cached_version:
+            return cached_reported, version
+        if not decode:
+            return payload, version
+        document = loads(payload)
+        return document["state"]["reported"], document.get("version")
+
+    def _set_shadows(self, sn, reported, service, versions=(None, None)):
+        previous = self._shadows.get(sn)
+        previous_index = previous.known_plan_index if previous is not None else None
+        cache = ShadowCache(
+            reported, service, previous_index, versions, self.metrics, sn
+        )
+        if previous is not None and previous.has_service(service, versions[1]):
+            cache.keep_service(previous)
+        self._shadows[sn] = cache
+        if not self._plan_listeners:
+            # Nobody follows the plans, leave them to be parsed when requested
+            return
+        if previous_index is cache.plan_index:
+            return
+
+        previous_names = previous_index.plans if previous_index is not None else {}
+        added = [name for name in cache.plan_names if name not in previous_names]
+        removed = [name for name in previous_names if name not in cache.plan_index]
+        if not added and not removed:
+            return
+        _LOGGER.debug(f"Plans of {sn} changed, added {added}, removed {removed}")
+        for listener in list(self._plan_listeners):
+            listener(sn, added, removed)
+
+    def _get_plan_details(self, sn, plan_name):
+        plan = self.get_plan(sn, plan_name)
+        if plan is None:
+            _LOGGER.debug(f"Plan {plan_name} not found on {sn}")
+            return ""
+        return plan
+
+    @staticmethod
+    def _start_payload(fan_speed):
+        return {
             "state": {
                 "desired": {
                     "startClean": {
@@ -88,30 +435,11 @@ class Conga:
             }
         }
 
-        self._send_payload(sn, payload)
-
-    def set_fan_speed(self, sn, level):
-        payload = {"state": {"desired": {"workNoisy": level}}}
-        _LOGGER.debug(payload)
-        self._refresh_iot_client()
-        self._iot_client.update_thing_shadow(
-            thingName=sn, payload=bytes(json.dumps(payload), "ascii")
-        )
-
-    def set_water_level(self, sn, level):
-        payload = {"state": {"desired": {"water": level}}}
-        _LOGGER.debug(payload)
-        self._refresh_iot_client()
-        self._iot_client.update_thing_shadow(
-            thingName=sn, payload=bytes(json.dumps(payload), "ascii")
-        )
-
-    def start_plan(self, sn, plan_name):
-        _LOGGER.info(f"Starting plan {plan_name} on {sn}")
+    @staticmethod
+    def _start_plan_payload(plan):
         allowed_chars = string.ascii_lowercase + string.ascii_uppercase + string.digits
         result_str = "".join(random.choice(allowed_chars) for i in range(10))
-        plan = self._get_plan_details(plan_name)
-        payload = {
+        return {
             "state": {
                 "desired": {
                     "StartTimedCleanTask": {
@@ -121,77 +449,15 @@ class Conga:
                 }
             }
         }
-        _LOGGER.warn(payload)
-        self._send_payload(sn, payload)
-
-    def home(self, sn):
-        payload = {"state": {"desired": {"startFindCharge": {"state": 1}}}}
-
-        self._send_payload(sn, payload)
-
-    def _get_plan_details(self, plan_name):
-        _LOGGER.debug(f"Looking for plan {plan_name}")
-        _LOGGER.debug(f"Plans: {self._plans}")
-        for plan in self._plans:
-            if plan["planName"] == plan_name:
-                return plan
-        return ""
-
-    def _send_payload(self, sn, payload):
-        _LOGGER.debug(payload)
-        self._refresh_iot_client()
-        self._iot_client.update_thing_shadow(
-            thingName=sn,
-            shadowName="service",
-            payload=bytes(json.dumps(payload), "ascii"),
-        )
 
-    def _refresh_api_token(self):
-        if self._api_token != None:
-            return self._api_token
+    @staticmethod
+    def _home_payload():
+        return {"state": {"desired": {"startFindCharge": {"state": 1}}}}
 
-        self._api_token = RequestsSrpAuth(
-            username=self._username,
-            password=self._password,
-            user_pool_id="eu-west-2_L5T0M5yrf",
-            client_id="6iep27ce22ojt8bgb2vji3d387",
-            user_pool_region="eu-west-2",
-        )
-
-    def _refresh_iot_client(self):
-        if (
-            self._iot_client != None
-            and self._iot_token_expiration != None
-            and datetime.datetime.now().timestamp()
-            < self._iot_token_expiration.timestamp()
-        ):
-            return self._iot_client
-
-        _LOGGER.info("Refreshing Cecotec Conga token")
+    @staticmethod
+    def _fan_speed_payload(level):
+        return {"state": {"desired": {"workNoisy": level}}}
 
-        u = Cognito(
-            "eu-west-2_L5T0M5yrf", "6iep27ce22ojt8bgb2vji3d387", username=self._username
-        )
-        u.authenticate(password=self._password)
-        cognito = boto3.client("cognito-identity", "eu-west-2")
-        response = cognito.get_id(
-            IdentityPoolId="eu-west-2:0cdeb155-55bb-45f8-9710-4895bd40d605",
-            Logins={
-                "cognito-idp.eu-west-2.amazonaws.com/eu-west-2_L5T0M5yrf": u.id_token
-            },
-        )
-        creds = cognito.get_credentials_for_identity(
-            IdentityId=response["IdentityId"],
-            Logins={
-                "cognito-idp.eu-west-2.amazonaws.com/eu-west-2_L5T0M5yrf": u.id_token
-            },
-        )
-        self._iot_client = boto3.client(
-            "iot-data",
-            region_name="eu-west-2",
-            endpoint_url=AWS_IOT_ENDPOINT,
-            aws_access_key_id=creds["Credentials"]["AccessKeyId"],
-            aws_secret_access_key=creds["Credentials"]["SecretKey"],
-            aws_session_token=creds["Credentials"]["SessionToken"],
-        )
-        self._iot_token_expiration = creds["Credentials"]["Expiration"]
+    @staticmethod
+    def _water_level_payload(level):
+        return {"state": {"desired": {"water": level}}}
@@ -2,9 +2,13 @@ BRAND = "Cecotec"
 DOMAIN = "cecotec_conga"
 MODEL = "Conga 5290"
 STEP_LOGIN = "login"
+STORAGE_VERSION = 1
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
 CONF_DEVICES = "devices"
+CONF_PUSH = "push"
+CONF_METRICS = "metrics"
+CONF_RATE_LIMIT = "rate_limit"
 FAN_SPEED_0 = "Off"
 FAN_SPEED_1 = "Eco"
 FAN_SPEED_2 = "Normal"
@@ -13,3 +17,5 @@ WATER_LEVEL_0 = "Off"
 WATER_LEVEL_1 = "Low"
 WATER_LEVEL_2 = "Medium"
 WATER_LEVEL_3 = "High"
+FAN_SPEEDS = [FAN_SPEED_0, FAN_SPEED_1, FAN_SPEED_2, FAN_SPEED_3]
+WATER_LEVELS = [WATER_LEVEL_0, WATER_LEVEL_1, WATER_LEVEL_2, WATER_LEVEL_3]
@@ -0,0 +1,303 @@
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .async_conga import REQUEST_ERRORS
+from .const import DOMAIN, STORAGE_VERSION
+from .push import CongaPushClient
+
+_LOGGER = logging.getLogger(__name__)
+
+UPDATE_INTERVAL = timedelta(seconds=60)
+# Polling is only a fallback while shadow updates are pushed
+PUSH_UPDATE_INTERVAL = timedelta(minutes=15)
+# Robot modes polled more or less often than UPDATE_INTERVAL
+MODE_UPDATE_INTERVALS = {
+    "sweep": timedelta(seconds=15),
+    "backcharge": timedelta(seconds=15),
+    "DustCenterWorking": timedelta(seconds=15),
+    "charge": timedelta(minutes=5),
+    "fullcharge": timedelta(minutes=5),
+    "shutdown": timedelta(minutes=10),
+}
+# Polling of a device right after a command, until the robot reports its effect
+BURST_UPDATE_INTERVAL = timedelta(seconds=3)
+BURST_DURATION = timedelta(seconds=30)
+# Seconds early a device may be polled to share a refresh with other devices
+POLL_TOLERANCE = 2
+# The devices of the account are listed again this often, to find new robots
+DEVICES_UPDATE_INTERVAL = timedelta(minutes=30)
+# Consecutive device lists a device must be missing from to be removed
+REMOVAL_CHECKS = 2
+# Seconds the last known shadows wait for more changes before being saved
+CACHE_SAVE_DELAY = 60
+
+
+def _changed_keys(old, new):
+    if old is new:
+        return set()
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class CongaDataUpdateCoordinator(DataUpdateCoordinator):
+    """Fetch the shadows of the devices of an account, each at its own pace.
+
+    Devices are polled often while cleaning or returning home and seldom
+    while docked, and every few seconds for a while after a command. The
+    coordinator wakes up when the next device is due and only fetches the
+    devices due by then. The device list of the account is checked every
+    DEVICES_UPDATE_INTERVAL, `devices` being updated in place. A device is
+    only removed once missing from REMOVAL_CHECKS lists in a row, and an
+    empty list is never taken as the removal of every device.
+
+    When a `store` and a `plans_store` are given, the last known reported
+    states and plans are saved to them, so the next start can show them
+    before the cloud is reached. Plans are only saved again when the
+    service shadow of a device changed.
+    """
+
+    def __init__(
+        self, hass, conga_client, devices, push=False, store=None, plans_store=None
+    ):
+        self._conga_client = conga_client
+        self._store = store
+        self._plans_store = plans_store
+        # Service shadow versions of the plans last saved
+        self._saved_service_versions = {}
+        self.devices = list(devices)
+        self._listed_devices = None
+        # Consecutive device lists every known device was missing from
+        self._missing = {}
+        self._devices_checked_at = None
+        self._device_listeners = []
+        self._push_client = None
+        self._push_start = None
+        if push:
+            self._push_client = CongaPushClient(
+                conga_client,
+                [device["sn"] for device in devices],
+                self._handle_push_update,
+            )
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_interval=UPDATE_INTERVAL,
+        )
+        # Status keys (and "plans") of every device changed by the last update
+        self.changed = {}
+        self._next_poll = {}
+        self._burst_until = {}
+        # Refreshes right after a command, without the cooldown of requested refreshes
+        self._burst_debouncer = Debouncer(
+            hass, _LOGGER, cooldown=0, immediate=True, function=self.async_refresh
+        )
+        # Tasks running the burst refreshes, cancelled when stopping
+        self._burst_tasks = set()
+
+    def add_device_listener(self, listener):
+        """Call `listener(added, removed)` whenever devices are added or removed.
+
+        `added` and `removed` are lists of device dicts. Returns a function
+        removing the listener.
+        """
+        self._device_listeners.append(listener)
+        return lambda: self._device_listeners.remove(listener)
+
+    async def async_restore(self):
+        """Show the shadows saved by the previous run until the first refresh.
+
+        Returns whether the state of any device is known, either restored or
+        still cached by a client shared with a previous setup.
+        """
+        if self._store is None or self._plans_store is None:
+            return False
+        shadows = await self._store.async_load() or {}
+        tactics = await self._plans_store.async_load() or {}
+        sns = {device["sn"] for device in self.devices}
+        restored = self._conga_client.restore_shadows(
+            {sn: shadow for sn, shadow in shadows.items() if sn in sns}, tactics
+        )
+        self._saved_service_versions = self._conga_client.service_versions(sns)
+        if not restored and not self._conga_client.export_shadows(sns):
+            return False
+        self.data = self._build_data()
+        return True
+
+    @callback
+    def async_start_push(self):
+        """Connect to push updates in the background."""
+        if self._push_client is not None:
+            self._push_start = self.hass.async_create_task(self._push_client.async_start())
+
+    async def async_stop(self):
+        """Stop push updates and pending refreshes."""
+        self._burst_debouncer.async_cancel()
+        for task in list(self._burst_tasks):
+            task.cancel()
+        if self._push_start is not None:
+            self._push_start.cancel()
+            self._push_start = None
+        if self._push_client is not None:
+            await self._push_client.async_stop()
+
+    def _build_data(self):
+        previous = self.data or {}
+        data = {}
+        changed = {}
+        for device in self.devices:
+            sn = device["sn"]
+            status = self._conga_client.get_status(sn)
+            if not status:
+                continue
+            plans = self._conga_client.list_plans(sn)
+            data[sn] = {"status": status, "plans": plans}
+
+            if sn not in previous:
+                changed[sn] = set(status) | {"plans"}
+                continue
+            changed[sn] = _changed_keys(previous[sn]["status"], status)
+            if plans is not previous[sn]["plans"] and plans != previous[sn]["plans"]:
+                changed[sn].add("plans")
+        self.changed = changed
+        return data
+
+    @callback
+    def async_update_from_cache(self, sn=None):
+        """Hand the cached state, optimistic changes included, to the entities.
+
+        Called when a command is sent to `sn`, which is then polled right away
+        and in burst until its reported state catches up.
+        """
+        self.data = self._build_data()
+        self.async_update_listeners()
+        if sn is None or self._push_connected:
+            return
+
+        now = time.monotonic()
+        self._burst_until[sn] = now + BURST_DURATION.total_seconds()
+        self._next_poll[sn] = now
+        task = self.hass.async_create_background_task(
+            self._burst_debouncer.async_call(), f"{DOMAIN} burst refresh of {sn}"
+        )
+        self._burst_tasks.add(task)
+        task.add_done_callback(self._burst_tasks.discard)
+
+    @property
+    def _push_connected(self):
+        # Polling only falls back to PUSH_UPDATE_INTERVAL while updates are pushed
+        return self._push_client is not None and self._push_client.connected
+
+    def _device_update_interval(self, sn, now):
+        if self._push_connected:
+            return PUSH_UPDATE_INTERVAL
+        if self._burst_until.get(sn, 0) > now:
+            return BURST_UPDATE_INTERVAL
+        mode = self._conga_client.get_status(sn).get("mode")
+        return MODE_UPDATE_INTERVALS.get(mode, UPDATE_INTERVAL)
+
+    def _schedule_save(self):
+        if self._store is None or self._plans_store is None:
+            return
+        sns = [device["sn"] for device in self.devices]
+        if any(self.changed.values()):
+            self._store.async_delay_save(
+                lambda: self._conga_client.export_shadows(sns), CACHE_SAVE_DELAY
+            )
+        # The service shadow is large, its plans are only saved when it changed
+        service_versions = self._conga_client.service_versions(sns)
+        if service_versions != self._saved_service_versions:
+            self._saved_service_versions = service_versions
+            self._plans_store.async_delay_save(
+                lambda: self._conga_client.export_tactics(sns), CACHE_SAVE_DELAY
+            )
+
+    @callback
+    def _handle_push_update(self, sn, shadow_name, reported, version=None):
+        if self._conga_client.apply_shadow_update(sn, shadow_name, reported, version):
+            self.async_set_updated_data(self._build_data())
+            self._schedule_save()
+
+    async def _async_update_devices(self):
+        self._devices_checked_at = time.monotonic()
+        try:
+            devices = await self._conga_client.list_vacuums()
+        except REQUEST_ERRORS as err:
+            _LOGGER.debug(f"Unable to refresh the device list: {err}")
+            return
+        if devices is self._listed_devices and not self._missing:
+            return
+        self._listed_devices = devices
+        if not devices:
+            _LOGGER.debug("Ignoring empty device list")
+            return
+
+        known = {device["sn"] for device in self.devices}
+        listed = {device["sn"] for device in devices}
+        added = [device for device in devices if device["sn"] not in known]
+        missing = [device for device in self.devices if device["sn"] not in listed]
+        self._missing = {
+            device["sn"]: self._missing.get(device["sn"], 0) + 1 for device in missing
+        }
+        removed = [
+            device for device in missing if self._missing[device["sn"]] >= REMOVAL_CHECKS
+        ]
+        if not added and not removed:
+            return
+        _LOGGER.info(
+            f"Devices changed, added {[device['sn'] for device in added]}, "
+            f"removed {[device['sn'] for device in removed]}"
+        )
+        # Devices missing from fewer lists are kept until they are listed again
+        self.devices[:] = devices + [
+            device for device in missing if device not in removed
+        ]
+        for device in removed:
+            self._missing.pop(device["sn"], None)
+            self._next_poll.pop(device["sn"], None)
+            self._burst_until.pop(device["sn"], None)
+        if self._push_client is not None:
+            self._push_client.set_serial_numbers(device["sn"] for device in self.devices)
+        for listener in list(self._device_listeners):
+            listener(added, removed)
+
+    async def _async_update_data(self):
+        now = time.monotonic()
+        if (
+            self._devices_checked_at is None
+            or now - self._devices_checked_at >= DEVICES_UPDATE_INTERVAL.total_seconds()
+        ):
+            await self._async_update_devices()
+            now = time.monotonic()
+        sns = [device["sn"] for device in self.devices]
+        due = [sn for sn in sns if self._next_poll.get(sn, 0) <= now + POLL_TOLERANCE]
+        # A refresh with nothing due has been requested, fetch everything
+        results, errors = await self._conga_client.update_all_shadows(due or sns)
+
+        now = time.monotonic()
+        for sn in due or sns:
+            self._next_poll[sn] = now + self._device_update_interval(sn, now).total_seconds()
+        next_poll = min(self._next_poll[sn] for sn in sns) if sns else now
+        self.update_interval = timedelta(seconds=max(next_poll - now, 1))
+
+        if errors and not results:
+            err = next(iter(errors.values()))
+            raise UpdateFailed(f"Unable to fetch data from API: {err}") from err
+        for sn, err in errors.items():
+            _LOGGER.warning(f"Unable to fetch data of {sn} from API: {err}")
+        data = self._build_data()
+        self._schedule_save()
+        return data
+
+
+def cache_store(hass, entry_id):
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.shadows")
+
+
+def plans_store(hass, entry_id):
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.plans")
@@ -0,0 +1,25 @@
+"""Diagnostics support for Cecotec Conga."""
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import CONF_PASSWORD, CONF_USERNAME, DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return the counters and latency histograms of a config entry."""
+    conga_data = hass.data[DOMAIN][entry.entry_id]
+    conga_client = conga_data["controller"]
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "available": conga_client.available,
+        "stats": conga_client.stats.as_dict(),
+        "command_stats": conga_client.command_stats.as_dict(),
+        "shadow_stats": conga_client.shadow_stats.as_dict(),
+        "resilience_stats": conga_client.resilience_stats.as_dict(),
+        "rate_limit_stats": conga_client.rate_limiter.stats.as_dict(),
+        "metrics": conga_client.metrics.as_dict(),
+    }
@@ -0,0 +1,23 @@
+"""JSON decoding and encoding of cloud payloads, through orjson when installed.
+
+Home Assistant ships orjson, the standard library is used everywhere else.
+Both functions work on bytes, which is what the cloud sends and expects.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+else:
+    loads = json.loads
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
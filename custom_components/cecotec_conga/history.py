@@ -0,0 +1,208 @@
+"""Cleaning sessions recorded from the mode changes of the robots."""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+# Modes a robot goes through between starting to clean and docking again
+SESSION_MODES = ["sweep", "pause", "backcharge", "DustCenterWorking"]
+# Sessions shorter than this many seconds, such as failed starts, are dropped
+MIN_SESSION_DURATION = 60
+# Seconds the index waits for more sessions before being saved
+INDEX_SAVE_DELAY = 10
+
+
+def _empty_index():
+    return {"size": 0, "devices": {}}
+
+
+class CleaningHistory:
+    """Cleaning sessions of the devices of a config entry.
+
+    A session starts when a robot starts sweeping and ends once it is back
+    to a mode outside SESSION_MODES. Each session is appended as a JSON line
+    to a log under the config directory. An index with the offset of every
+    session and per-device totals is stored next to it, so queries only read
+    the sessions they return and totals never read the log.
+    """
+
+    def __init__(self, hass, entry_id, conga_client):
+        self._hass = hass
+        self._conga_client = conga_client
+        self._path = log_path(hass, entry_id)
+        self._store = index_store(hass, entry_id)
+        self._index = _empty_index()
+        self._sessions = {}
+        self._listeners = []
+        self._write_lock = asyncio.Lock()
+
+    async def async_load(self):
+        index = await self._store.async_load() or _empty_index()
+        self._index = await self._hass.async_add_executor_job(self._catch_up, index)
+
+    def add_listener(self, listener):
+        """Call `listener(sn)` whenever a session of a device is recorded.
+
+        Returns a function removing the listener.
+        """
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def last_session(self, sn):
+        device = self._index["devices"].get(sn)
+        if device is None:
+            return None
+        return device["last"]
+
+    def session_count(self, sn):
+        device = self._index["devices"].get(sn)
+        if device is None:
+            return 0
+        return len(device["offsets"])
+
+    def average_area_per_minute(self, sn):
+        """Return the square meters cleaned per minute over all sessions."""
+        device = self._index["devices"].get(sn)
+        if device is None or device["duration"] <= 0:
+            return None
+        return device["area"] / (device["duration"] / 60)
+
+    async def async_get_sessions(self, sn, limit=None):
+        """Return the sessions of `sn`, oldest first, or the last `limit` ones."""
+        device = self._index["devices"].get(sn)
+        if device is None:
+            return []
+        offsets = device["offsets"]
+        if limit is not None:
+            offsets = offsets[-limit:] if limit > 0 else []
+        return await self._hass.async_add_executor_job(self._read, offsets)
+
+    @callback
+    def async_observe(self, data):
+        """Follow the modes in the coordinator data, recording ended sessions."""
+        for sn, device_data in (data or {}).items():
+            self._observe(sn, device_data["status"])
+
+    def _observe(self, sn, status):
+        mode = status.get("mode")
+        session = self._sessions.get(sn)
+        if session is None:
+            if mode == "sweep":
+                self._sessions[sn] = {
+                    "start": time.time(),
+                    "battery": status.get("elec"),
+                    "min_battery": status.get("elec"),
+                    "area": status.get("cleanArea", 0),
+                    # Only plans started from Home Assistant are known
+                    "plan": self._conga_client.pop_started_plan(sn),
+                }
+            return
+
+        if mode in SESSION_MODES:
+            session["area"] = max(session["area"], status.get("cleanArea", 0))
+            battery = status.get("elec")
+            if battery is not None and (
+                session["min_battery"] is None or battery < session["min_battery"]
+            ):
+                session["min_battery"] = battery
+            return
+
+        del self._sessions[sn]
+        end = time.time()
+        if end - session["start"] < MIN_SESSION_DURATION:
+            return
+        battery_drop = None
+        if session["battery"] is not None and session["min_battery"] is not None:
+            battery_drop = session["battery"] - session["min_battery"]
+        record = {
+            "sn": sn,
+            "start": round(session["start"]),
+            "end": round(end),
+            "duration": round(end - session["start"]),
+            "area": session["area"],
+            "battery": battery_drop,
+            "plan": session["plan"],
+        }
+        self._hass.async_create_task(self._async_append(record))
+
+    async def _async_append(self, record):
+        async with self._write_lock:
+            offset = await self._hass.async_add_executor_job(self._append, record)
+        _LOGGER.debug(f"Recorded cleaning session {record}")
+        self._add_to_index(self._index, record, offset)
+        self._index["size"] = offset + len(_encode(record))
+        self._store.async_delay_save(lambda: self._index, INDEX_SAVE_DELAY)
+        for listener in list(self._listeners):
+            listener(record["sn"])
+
+    def _append(self, record):
+        with open(self._path, "ab") as log:
+            offset = log.tell()
+            log.write(_encode(record))
+        return offset
+
+    def _read(self, offsets):
+        sessions = []
+        with open(self._path, "rb") as log:
+            for offset in offsets:
+                log.seek(offset)
+                sessions.append(json.loads(log.readline()))
+        return sessions
+
+    def _catch_up(self, index):
+        """Add the sessions appended after the index was last saved."""
+        try:
+            size = os.path.getsize(self._path)
+        except FileNotFoundError:
+            return _empty_index()
+        if size < index["size"]:
+            _LOGGER.warning("Cleaning history log is shorter than its index, rebuilding it")
+            index = _empty_index()
+        if size == index["size"]:
+            return index
+
+        with open(self._path, "r+b") as log:
+            log.seek(index["size"])
+            offset = index["size"]
+            for line in log:
+                if not line.endswith(b"\n"):
+                    # Drop a record left half written, so appends start on a new line
+                    log.truncate(offset)
+                    break
+                try:
+                    self._add_to_index(index, json.loads(line), offset)
+                except (ValueError, KeyError):
+                    _LOGGER.warning(f"Skipping malformed cleaning session at {offset}")
+                offset += len(line)
+        index["size"] = offset
+        return index
+
+    @staticmethod
+    def _add_to_index(index, record, offset):
+        device = index["devices"].setdefault(
+            record["sn"], {"offsets": [], "area": 0, "duration": 0, "last": None}
+        )
+        device["offsets"].append(offset)
+        device["area"] += record["area"] or 0
+        device["duration"] += record["duration"]
+        device["last"] = record
+
+
+def _encode(record):
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def log_path(hass, entry_id):
+    return hass.config.path(".storage", f"{DOMAIN}.{entry_id}.sessions")
+
+
+def index_store(hass, entry_id):
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.sessions_index")
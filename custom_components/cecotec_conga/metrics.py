@@ -0,0 +1,115 @@
+"""Latency histograms of the network and parsing steps of the Conga clients."""
+from collections import deque
+from contextlib import nullcontext
+import time
+
+# Latest samples percentiles are computed from
+HISTOGRAM_WINDOW = 500
+
+_NULL_TIMER = nullcontext()
+
+
+class LatencyHistogram:
+    """Call and error counts of an operation, with its latest latencies."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.samples = deque(maxlen=HISTOGRAM_WINDOW)
+
+    def record(self, seconds, error=False):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.samples.append(seconds)
+
+    def percentiles(self, *percentiles):
+        """Return the latencies at `percentiles` in milliseconds, None if unknown."""
+        if not self.samples:
+            return [None for _ in percentiles]
+        samples = sorted(self.samples)
+        return [
+            round(samples[min(len(samples) - 1, int(len(samples) * percentile / 100))] * 1000, 3)
+            for percentile in percentiles
+        ]
+
+    def as_dict(self):
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+        }
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_operation", "_sn", "_start")
+
+    def __init__(self, metrics, operation, sn):
+        self._metrics = metrics
+        self._operation = operation
+        self._sn = sn
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._metrics.record(
+            self._operation, time.perf_counter() - self._start, exc_type is not None, self._sn
+        )
+        return False
+
+
+class Metrics:
+    """Latency histograms per operation, and per operation and device.
+
+    While disabled, `timer` hands out a shared no-op context manager and
+    nothing is recorded.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.operations = {}
+        self.devices = {}
+
+    def timer(self, operation, sn=None):
+        """Return a context manager timing `operation`, for device `sn` if given."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, operation, sn)
+
+    def record(self, operation, seconds, error=False, sn=None):
+        histogram = self.operations.get(operation)
+        if histogram is None:
+            histogram = self.operations[operation] = LatencyHistogram()
+        histogram.record(seconds, error)
+        if sn is None:
+            return
+        histogram = self.devices.setdefault(sn, {}).get(operation)
+        if histogram is None:
+            histogram = self.devices[sn][operation] = LatencyHistogram()
+        histogram.record(seconds, error)
+
+    def get(self, operation, sn=None):
+        if sn is None:
+            return self.operations.get(operation)
+        return self.devices.get(sn, {}).get(operation)
+
+    def as_dict(self):
+        return {
+            "enabled": self.enabled,
+            "operations": {
+                operation: histogram.as_dict()
+                for operation, histogram in self.operations.items()
+            },
+            "devices": {
+                sn: {
+                    operation: histogram.as_dict()
+                    for operation, histogram in operations.items()
+                }
+                for sn, operations in self.devices.items()
+            },
+        }
@@ -0,0 +1,171 @@
+"""Shadow updates pushed by AWS IoT over MQTT on websockets."""
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+from .async_conga import REQUEST_ERRORS
+from .conga import AWS_IOT_ENDPOINT, AWS_REGION
+from .encoding import loads
+from .sigv4 import presign_path
+
+_LOGGER = logging.getLogger(__name__)
+
+MQTT_SERVICE = "iotdevicegateway"
+MQTT_PATH = "/mqtt"
+MQTT_KEEPALIVE = 60
+SHADOW_TOPIC = "$aws/things/{sn}/shadow/update/documents"
+NAMED_SHADOW_TOPIC = "$aws/things/{sn}/shadow/name/{name}/update/documents"
+SHADOW_NAMES = [None, "service"]
+# Seconds before retrying a failed start, doubled on every failure up to START_RETRY_MAX
+START_RETRY = 30
+START_RETRY_MAX = 900
+
+
+def _shadow_topics(serial_numbers):
+    topics = {}
+    for sn in serial_numbers:
+        for shadow_name in SHADOW_NAMES:
+            if shadow_name is None:
+                topic = SHADOW_TOPIC.format(sn=sn)
+            else:
+                topic = NAMED_SHADOW_TOPIC.format(sn=sn, name=shadow_name)
+            topics[topic] = (sn, shadow_name)
+    return topics
+
+
+def _new_mqtt_client(client_id):
+    # Imported here so paho is only loaded when push updates are enabled
+    import paho.mqtt.client as mqtt
+
+    # paho-mqtt 2 requires choosing the callback API version explicitly
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        return mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION1,
+            client_id=client_id,
+            transport="websockets",
+        )
+    return mqtt.Client(client_id=client_id, transport="websockets")
+
+
+class CongaPushClient:
+    """Subscribe to the shadow update documents of a set of devices.
+
+    `on_update(sn, shadow_name, reported, version)` is called in the event
+    loop for every document received. The endpoint can point to a plain `ws://` MQTT
+    broker, in which case requests are neither signed nor encrypted.
+    """
+
+    def __init__(self, conga_client, serial_numbers, on_update, endpoint=AWS_IOT_ENDPOINT):
+        self._conga_client = conga_client
+        self._on_update = on_update
+        self._endpoint = urlsplit(endpoint)
+        self._secure = self._endpoint.scheme in ("https", "wss")
+        self._loop = None
+        self._client = None
+        self._topics = _shadow_topics(serial_numbers)
+
+    @property
+    def connected(self):
+        return self._client is not None and self._client.is_connected()
+
+    def set_serial_numbers(self, serial_numbers):
+        """Follow the shadows of `serial_numbers` instead of the current devices."""
+        topics = _shadow_topics(serial_numbers)
+        added = [topic for topic in topics if topic not in self._topics]
+        removed = [topic for topic in self._topics if topic not in topics]
+        self._topics = topics
+        if not self.connected:
+            # Subscribed to on connection
+            return
+        if added:
+            self._client.subscribe([(topic, 1) for topic in added])
+        if removed:
+            self._client.unsubscribe(removed)
+
+    async def async_start(self):
+        """Connect, retrying while the cloud cannot be reached."""
+        self._loop = asyncio.get_running_loop()
+        retry = START_RETRY
+        while True:
+            try:
+                await self._async_connect()
+                return
+            except (*REQUEST_ERRORS, OSError) as err:
+                self._client = None
+                _LOGGER.warning(
+                    f"Unable to start Cecotec Conga push updates ({err!r}), "
+                    f"retrying in {retry}s"
+                )
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, START_RETRY_MAX)
+
+    async def _async_connect(self):
+        client_id = None
+        if self._secure:
+            # The Cognito identity policy only allows its own id as client id
+            client_id = await self._conga_client.get_identity_id()
+        self._client = _new_mqtt_client(client_id or "")
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        if self._secure:
+            # Loading the CA certificates reads from disk
+            await self._loop.run_in_executor(None, self._client.tls_set)
+        await self._async_refresh_path()
+
+        port = self._endpoint.port or (443 if self._secure else 80)
+        self._client.connect_async(self._endpoint.hostname, port, MQTT_KEEPALIVE)
+        self._client.loop_start()
+
+    async def async_stop(self):
+        if self._client is None:
+            return
+        client = self._client
+        self._client = None
+        client.disconnect()
+        await self._loop.run_in_executor(None, client.loop_stop)
+
+    async def _async_refresh_path(self):
+        path = self._endpoint.path or MQTT_PATH
+        if self._secure:
+            credentials = await self._conga_client.get_iot_credentials()
+            path = presign_path(
+                self._endpoint.netloc,
+                path,
+                AWS_REGION,
+                MQTT_SERVICE,
+                credentials["AccessKeyId"],
+                credentials["SecretKey"],
+                credentials["SessionToken"],
+            )
+        if self._client is not None:
+            self._client.ws_set_options(path=path)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            _LOGGER.warning(f"Unable to connect to MQTT endpoint, return code {rc}")
+            return
+        _LOGGER.info("Connected to Cecotec Conga push updates")
+        client.subscribe([(topic, 1) for topic in self._topics])
+
+    def _on_disconnect(self, client, userdata, rc):
+        if rc == 0 or self._client is None:
+            return
+        _LOGGER.warning("Disconnected from Cecotec Conga push updates, reconnecting")
+        # Signed URLs embed short-lived credentials, sign a new one before paho retries
+        asyncio.run_coroutine_threadsafe(self._async_refresh_path(), self._loop)
+
+    def _on_message(self, client, userdata, message):
+        self._loop.call_soon_threadsafe(self._handle_message, message.topic, message.payload)
+
+    def _handle_message(self, topic, payload):
+        if topic not in self._topics:
+            return
+        sn, shadow_name = self._topics[topic]
+        try:
+            current = loads(payload)["current"]
+            reported = current["state"]["reported"]
+        except (ValueError, KeyError, TypeError):
+            _LOGGER.debug(f"Ignoring malformed shadow document on {topic}")
+            return
+        self._on_update(sn, shadow_name, reported, current.get("version"))
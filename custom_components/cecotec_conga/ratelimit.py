@@ -0,0 +1,134 @@
+"""Token bucket spacing out the requests of an account to the Conga cloud."""
+import asyncio
+import threading
+import time
+
+# Requests per second let through on average, and in a burst after a pause
+DEFAULT_RATE = 10
+DEFAULT_BURST = 20
+# Lowest rate that can be set in the options, a refresh of every device
+# having to go through the bucket in a reasonable time
+MIN_RATE = 1
+
+
+class RateLimitStats:
+    """Waits of the requests that went through a RateLimiter.
+
+    `queue_depth` is the number of requests waiting for their turn right now.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.delayed = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    @property
+    def average_wait(self):
+        if self.requests == 0:
+            return 0.0
+        return self.wait_time / self.requests
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "wait_time": round(self.wait_time, 3),
+            "average_wait": round(self.average_wait, 3),
+            "max_wait": round(self.max_wait, 3),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class RateLimiter:
+    """Let requests through at `rate` per second, up to `burst` at once.
+
+    Every request takes a token from the bucket, which refills at `rate`
+    tokens per second and holds at most `burst`. A request finding the
+    bucket empty reserves the next token and waits for it, so waiting
+    requests go through in the order they came. A `rate` of 0 lets every
+    request through right away. Waits are recorded as the `rate_limit_wait`
+    operation of `metrics` when given.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, metrics=None):
+        self.stats = RateLimitStats()
+        self._metrics = metrics
+        # Reservations are made from the event loop and from worker threads
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst=DEFAULT_BURST):
+        with self._lock:
+            self.rate = rate
+            self.burst = max(burst, 1)
+            self._tokens = self.burst
+            self._updated_at = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    async def async_acquire(self):
+        """Wait until the request may be sent."""
+        if not self.enabled:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._cancel()
+                raise
+            finally:
+                with self._lock:
+                    self.stats.queue_depth -= 1
+        self._record(delay)
+
+    def acquire(self):
+        """Block until the request may be sent."""
+        if not self.enabled:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                with self._lock:
+                    self.stats.queue_depth -= 1
+        self._record(delay)
+
+    def _reserve(self):
+        """Take a token, returning the seconds to wait until it is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            self.stats.queue_depth += 1
+            self.stats.max_queue_depth = max(
+                self.stats.max_queue_depth, self.stats.queue_depth
+            )
+            return -self._tokens / self.rate
+
+    def _cancel(self):
+        # The token of a request that gave up waiting goes to the next one
+        with self._lock:
+            self._tokens += 1
+
+    def _record(self, delay):
+        with self._lock:
+            self.stats.requests += 1
+            if delay > 0:
+                self.stats.delayed += 1
+                self.stats.wait_time += delay
+                self.stats.max_wait = max(self.stats.max_wait, delay)
+        if self._metrics is not None and self._metrics.enabled:
+            self._metrics.record("rate_limit_wait", delay)
@@ -0,0 +1,104 @@
+"""Conga clients shared by the config entries and flows of the same account."""
+from functools import partial
+import hashlib
+import logging
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .async_conga import AsyncConga
+from .const import DOMAIN, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_REGISTRY = f"{DOMAIN}_clients"
+# Seconds a client nobody uses is kept, so reloads and the setup following
+# the config flow reuse its tokens and connections
+IDLE_TIMEOUT = 60
+
+
+def account_key(username):
+    return username.strip().casefold()
+
+
+def token_store(hass, username):
+    digest = hashlib.sha1(account_key(username).encode("utf-8")).hexdigest()
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.tokens.{digest}")
+
+
+class ClientRegistry:
+    """Authenticated clients keyed by account, shared across the process.
+
+    Every user acquires a client and releases it when done. Once the last
+    user releases it, the client is closed after IDLE_TIMEOUT seconds unless
+    it is acquired again in between. When the password of an account
+    changes, a new client is created and the previous one is closed as soon
+    as its last user releases it.
+    """
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._accounts = {}
+        self._users = {}
+        self._idle = {}
+
+    @callback
+    def async_acquire(self, username, password):
+        key = account_key(username)
+        client, client_password = self._accounts.get(key, (None, None))
+        if client is None or client_password != password:
+            _LOGGER.debug(f"Creating Conga client for {username}")
+            client = AsyncConga(username, password, store=token_store(self._hass, username))
+            self._accounts[key] = (client, password)
+
+        cancel_idle = self._idle.pop(client, None)
+        if cancel_idle is not None:
+            cancel_idle()
+        self._users[client] = self._users.get(client, 0) + 1
+        return client
+
+    @callback
+    def async_release(self, client):
+        self._users[client] -= 1
+        if self._users[client] > 0:
+            return
+        del self._users[client]
+        if not self._is_current(client):
+            self._hass.async_create_task(client.close())
+            return
+        self._idle[client] = async_call_later(
+            self._hass, IDLE_TIMEOUT, partial(self._async_close_idle, client)
+        )
+
+    async def async_close(self, *_):
+        for cancel_idle in self._idle.values():
+            cancel_idle()
+        self._idle.clear()
+        clients = [client for client, _ in self._accounts.values()]
+        self._accounts.clear()
+        self._users.clear()
+        for client in clients:
+            await client.close()
+
+    def _is_current(self, client):
+        return any(current is client for current, _ in self._accounts.values())
+
+    async def _async_close_idle(self, client, _now):
+        self._idle.pop(client, None)
+        for key, (current, _) in list(self._accounts.items()):
+            if current is client:
+                del self._accounts[key]
+        _LOGGER.debug("Closing unused Conga client")
+        await client.close()
+
+
+@callback
+def async_get_registry(hass):
+    """Return the client registry, creating it on first use."""
+    registry = hass.data.get(DATA_REGISTRY)
+    if registry is None:
+        registry = hass.data[DATA_REGISTRY] = ClientRegistry(hass)
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, registry.async_close)
+    return registry
@@ -0,0 +1,200 @@
+"""Retries, backoff and circuit breaking for the requests to the Conga cloud."""
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+# Attempts made for a request before giving up on it
+MAX_ATTEMPTS = 3
+# Seconds of the first backoff, doubled on every retry up to BACKOFF_MAX
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+# Retries each request adds to the budget, which holds at most RETRY_BUDGET_MAX
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MAX = 10
+# Consecutive failed requests that open the circuit
+FAILURE_THRESHOLD = 5
+# Seconds the circuit stays open, doubled every time a trial request fails
+OPEN_TIMEOUT = 30
+OPEN_TIMEOUT_MAX = 600
+# Statuses meaning the request was refused before being processed
+RETRY_STATUSES = [429, 502, 503, 504]
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CongaUnavailableError(Exception):
+    """Raised without contacting the cloud while it is considered down."""
+
+
+def is_transient(err, idempotent=True):
+    """Return whether `err` is a failure of the cloud worth retrying.
+
+    Requests that are not idempotent are only retried when the cloud
+    certainly did not act on them.
+    """
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status in RETRY_STATUSES or (idempotent and err.status >= 500)
+    if isinstance(err, aiohttp.ClientConnectorError):
+        return True
+    if isinstance(err, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return idempotent
+    return False
+
+
+class ResilienceStats:
+    """Failure, retry and circuit breaker counters of a RequestGuard."""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.retry_time = 0.0
+        self.short_circuited = 0
+        self.circuit_opened = 0
+        self.circuit_state = CLOSED
+
+    @property
+    def failure_rate(self):
+        if self.requests == 0:
+            return 0.0
+        return self.failures / self.requests
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "failure_rate": round(self.failure_rate, 3),
+            "retries": self.retries,
+            "retry_time": round(self.retry_time, 3),
+            "short_circuited": self.short_circuited,
+            "circuit_opened": self.circuit_opened,
+            "circuit_state": self.circuit_state,
+        }
+
+
+class RequestGuard:
+    """Run the requests of an account with retries and a circuit breaker.
+
+    Transient failures are retried with exponential backoff and full jitter,
+    as long as the retry budget allows it, so an outage does not multiply
+    the load on the cloud. After FAILURE_THRESHOLD requests in a row fail,
+    the circuit opens and requests fail right away with
+    CongaUnavailableError. Once the open timeout expires a single trial
+    request is let through, closing the circuit again if it succeeds.
+    `on_state_change` is called whenever the circuit opens or closes.
+    """
+
+    def __init__(self, on_state_change=None):
+        self.stats = ResilienceStats()
+        self._on_state_change = on_state_change
+        self._consecutive_failures = 0
+        self._open_timeout = OPEN_TIMEOUT
+        self._opened_at = 0
+        self._trial_running = False
+        self._retry_budget = RETRY_BUDGET_MAX
+
+    @property
+    def available(self):
+        return self.stats.circuit_state == CLOSED
+
+    async def async_call(self, request, idempotent=True):
+        """Await `request()`, retrying it while it fails transiently."""
+        trial = self._before_request()
+        self.stats.requests += 1
+        self._retry_budget = min(
+            RETRY_BUDGET_MAX, self._retry_budget + RETRY_BUDGET_RATIO
+        )
+        attempt = 1
+        while True:
+            try:
+                result = await request()
+            except asyncio.CancelledError:
+                if trial:
+                    self._trial_running = False
+                raise
+            except Exception as err:
+                transient = is_transient(err, idempotent)
+                if (
+                    not transient
+                    or trial
+                    or attempt >= MAX_ATTEMPTS
+                    or self._retry_budget < 1
+                ):
+                    self._after_failure(transient, trial)
+                    raise
+                self._retry_budget -= 1
+                backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+                _LOGGER.debug(f"Request failed ({err!r}), retrying in {backoff:.2f}s")
+                self.stats.retries += 1
+                self.stats.retry_time += backoff
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            self._after_success(trial)
+            return result
+
+    def _before_request(self):
+        """Return whether the request is the trial of a half open circuit."""
+        if self.stats.circuit_state == CLOSED:
+            return False
+        if (
+            self.stats.circuit_state == OPEN
+            and time.monotonic() - self._opened_at >= self._open_timeout
+        ):
+            self.stats.circuit_state = HALF_OPEN
+        if self.stats.circuit_state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.stats.short_circuited += 1
+        raise CongaUnavailableError("Conga cloud unavailable, waiting before retrying")
+
+    def _after_success(self, trial):
+        self._consecutive_failures = 0
+        if trial:
+            self._close()
+
+    def _after_failure(self, transient, trial):
+        self.stats.failures += 1
+        if not transient:
+            # The cloud answered, so it is not down
+            self._consecutive_failures = 0
+            if trial:
+                self._close()
+            return
+
+        self._consecutive_failures += 1
+        if trial:
+            self._trial_running = False
+            self._open_timeout = min(self._open_timeout * 2, OPEN_TIMEOUT_MAX)
+            self._opened_at = time.monotonic()
+            self.stats.circuit_state = OPEN
+        elif (
+            self.stats.circuit_state == CLOSED
+            and self._consecutive_failures >= FAILURE_THRESHOLD
+        ):
+            _LOGGER.warning(
+                f"Conga cloud failed {self._consecutive_failures} times in a row, "
+                f"pausing requests for {self._open_timeout}s"
+            )
+            self.stats.circuit_opened += 1
+            self._opened_at = time.monotonic()
+            self.stats.circuit_state = OPEN
+            self._notify()
+
+    def _close(self):
+        _LOGGER.info("Conga cloud reachable again")
+        self._trial_running = False
+        self._open_timeout = OPEN_TIMEOUT
+        self.stats.circuit_state = CLOSED
+        self._notify()
+
+    def _notify(self):
+        if self._on_state_change is not None:
+            self._on_state_change()
@@ -1,28 +1,46 @@
-from datetime import timedelta
 import logging
-from homeassistant.util import Throttle
-from homeassistant.core import HomeAssistant
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.helpers.entity import DeviceInfo, Entity, EntityCategory
 from homeassistant.const import (
     AREA_SQUARE_METERS,
+    PERCENTAGE,
     UnitOfTime,    
 )
-from requests import HTTPError
 
 from .button import CongaEntity
-from .utils import build_device_info
+from .utils import async_track_reported_keys, build_device_info
 from .const import (
     BRAND,
     CONF_DEVICES,
+    CONF_METRICS,
     DOMAIN,
+    FAN_SPEEDS,
     MODEL,
+    WATER_LEVELS,
 )
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(seconds=60)
-
 _LOGGER = logging.getLogger(__name__)
 
+def _minutes(seconds):
+    return round(seconds / 60)
+
+
+def _option(options):
+    def _value(index):
+        if isinstance(index, int) and 0 <= index < len(options):
+            return options[index]
+        return None
+
+    return _value
+
+
+# Sensors of the reported shadow keys, created once a device reports the key.
+# "value" converts the reported value, which is shown as is otherwise.
 sensors = [
     {
         "id": "cleanArea",
@@ -35,40 +53,141 @@ sensors = [
         "name": "Clean All Area",
         "icon": "mdi:vector-square",
         "unit": AREA_SQUARE_METERS,
+        "state_class": SensorStateClass.TOTAL_INCREASING,
     },
     {
         "id": "cleanTime",
         "name": "Clean Time",
         "icon": "mdi:clock-outline",
         "unit": UnitOfTime.MINUTES,
+        "value": _minutes,
     },
     {
         "id": "allTime",
         "name": "Clean All Time",
         "icon": "mdi:clock-outline",
         "unit": UnitOfTime.MINUTES,
+        "state_class": SensorStateClass.TOTAL_INCREASING,
+        "value": _minutes,
+    },
+    {
+        "id": "elec",
+        "name": "Battery",
+        "icon": None,
+        "unit": PERCENTAGE,
+        "device_class": SensorDeviceClass.BATTERY,
+        "state_class": SensorStateClass.MEASUREMENT,
+        "entity_category": EntityCategory.DIAGNOSTIC,
+    },
+    {
+        "id": "mode",
+        "name": "Mode",
+        "icon": "mdi:robot-vacuum",
+        "unit": None,
+    },
+    {
+        "id": "workNoisy",
+        "name": "Fan Speed",
+        "icon": "mdi:fan",
+        "unit": None,
+        "device_class": SensorDeviceClass.ENUM,
+        "options": FAN_SPEEDS,
+        "value": _option(FAN_SPEEDS),
+    },
+    {
+        "id": "water",
+        "name": "Water Level",
+        "icon": "mdi:water",
+        "unit": None,
+        "device_class": SensorDeviceClass.ENUM,
+        "options": WATER_LEVELS,
+        "value": _option(WATER_LEVELS),
+    },
+]
+
+history_sensors = [
+    {
+        "id": "last_session_area",
+        "name": "Last Session Area",
+        "icon": "mdi:vector-square",
+        "unit": AREA_SQUARE_METERS,
+    },
+    {
+        "id": "area_per_minute",
+        "name": "Average Cleaning Rate",
+        "icon": "mdi:speedometer",
+        "unit": f"{AREA_SQUARE_METERS}/{UnitOfTime.MINUTES}",
+    },
+]
+
+# Only created when latency metrics are enabled in the options
+latency_sensors = [
+    {
+        "id": "get_shadow",
+        "name": "Shadow Fetch Latency",
+        "icon": "mdi:timer-outline",
+        "unit": UnitOfTime.MILLISECONDS,
+        "state_class": SensorStateClass.MEASUREMENT,
+        "entity_category": EntityCategory.DIAGNOSTIC,
+    },
+    {
+        "id": "update_shadow",
+        "name": "Command Latency",
+        "icon": "mdi:timer-outline",
+        "unit": UnitOfTime.MILLISECONDS,
+        "state_class": SensorStateClass.MEASUREMENT,
+        "entity_category": EntityCategory.DIAGNOSTIC,
     },
 ]
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the Cecotec Conga sensor from a config entry."""
-    entities = []
+    conga_data = hass.data[DOMAIN][config_entry.entry_id]
+
+    descriptors = {sensor["id"]: sensor for sensor in sensors}
+
+    @callback
+    def async_add_keys(device, keys):
+        async_add_entities(
+            [
+                CongaVacuumSensor(
+                    hass, conga_data, device["sn"], device["note_name"], descriptors[key]
+                )
+                for key in keys
+            ]
+        )
 
-    devices = hass.data[DOMAIN][config_entry.entry_id]["devices"]
+    @callback
+    def async_add_devices(devices, removed=()):
+        entities = []
+        for device in devices:
+            for sensor in history_sensors:
+                entities.append(
+                    CongaVacuumHistorySensor(
+                        hass, conga_data, device["sn"], device["note_name"], sensor
+                    )
+                )
+            if config_entry.options.get(CONF_METRICS, False):
+                for sensor in latency_sensors:
+                    entities.append(
+                        CongaVacuumLatencySensor(
+                            hass, conga_data, device["sn"], device["note_name"], sensor
+                        )
+                    )
+        if entities:
+            async_add_entities(entities)
 
-    for device in devices:
-        conga_data = hass.data[DOMAIN][config_entry.entry_id]
-        for sensor in sensors:
-            sensor_entity = CongaVacuumPlanButton(
-                hass, conga_data, device["sn"], device["note_name"], sensor
-            )
-            entities.append(sensor_entity)
+    async_add_devices(conga_data["devices"])
+    config_entry.async_on_unload(
+        conga_data["coordinator"].add_device_listener(async_add_devices)
+    )
+    async_track_reported_keys(config_entry, conga_data, list(descriptors), async_add_keys)
 
-    async_add_entities(entities, update_before_add=True)
 
 
+class CongaVacuumSensor(SensorEntity, CongaEntity):
+    """Sensor of a reported shadow key of a device."""
 
-class CongaVacuumPlanButton(SensorEntity, CongaEntity):
     def __init__(
         self,
         hass: HomeAssistant,
@@ -88,8 +207,14 @@ class CongaVacuumPlanButton(SensorEntity, CongaEntity):
         self._state = None
         self._attribute_id = sensor['id']
         self._unique_id = f"{self._device_name}_{sensor['id']}"
+        self._value = sensor.get("value")
+        self._attr_device_class = sensor.get("device_class")
+        self._attr_state_class = sensor.get("state_class")
+        self._attr_options = sensor.get("options")
+        self._attr_entity_category = sensor.get("entity_category")
         CongaEntity.__init__(self, conga_data, device_name, sn)
         SensorEntity.__init__(self)
+        self._update_from_data()
 
     @property
     def name(self):
@@ -114,16 +239,93 @@ class CongaVacuumPlanButton(SensorEntity, CongaEntity):
         """Icon of the entity."""
         return self._icon
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Get the next bus information."""
-        try:
-            state_all = self._conga_client.get_status()
+    def _update_from_data(self):
+        state_all = self.device_data.get("status", {})
+        if self._attribute_id not in state_all:
+            return
+
+        value = state_all[self._attribute_id]
+        self._state = self._value(value) if self._value is not None else value
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if not self.device_changed((self._attribute_id,)):
+            return
+        self._update_from_data()
+        self.async_write_state_if_changed()
+
+
+class CongaVacuumHistorySensor(CongaVacuumSensor):
+    """Sensor computed from the recorded cleaning sessions of a device."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        conga_data: dict,
+        sn: str,
+        device_name: str,
+        sensor: dict,
+    ):
+        self._history = conga_data["history"]
+        super().__init__(hass, conga_data, sn, device_name, sensor)
+        # Keyed by serial number, renaming the device keeps the entity
+        self._unique_id = f"{sn}_{sensor['id']}"
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self._history.add_listener(self._handle_history_update))
+
+    def _update_from_data(self):
+        if self._attribute_id == "last_session_area":
+            session = self._history.last_session(self._sn)
+            self._state = session["area"] if session else None
+        else:
+            rate = self._history.average_area_per_minute(self._sn)
+            self._state = round(rate, 2) if rate is not None else None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Sessions are only recorded through the history listener, write availability changes."""
+        self.async_write_state_if_changed()
+
+    @callback
+    def _handle_history_update(self, sn) -> None:
+        if sn != self._sn:
+            return
+        self._update_from_data()
+        self.async_write_state_if_changed()
+
+
+class CongaVacuumLatencySensor(CongaVacuumSensor):
+    """95th percentile latency of a request to the cloud for a device."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        conga_data: dict,
+        sn: str,
+        device_name: str,
+        sensor: dict,
+    ):
+        self._attributes = {}
+        super().__init__(hass, conga_data, sn, device_name, sensor)
+        # Keyed by serial number, renaming the device keeps the entity
+        self._unique_id = f"{sn}_{sensor['id']}"
+
+    @property
+    def extra_state_attributes(self):
+        return self._attributes
 
-            if self._attribute_id in ["cleanTime", "allTime"]:
-                self._state = round(state_all[self._attribute_id] / 60)
-            else:
-                self._state = state_all[self._attribute_id]
+    def _update_from_data(self):
+        histogram = self._conga_client.metrics.get(self._attribute_id, self._sn)
+        if histogram is None:
+            return
+        self._attributes = histogram.as_dict()
+        self._state = self._attributes["p95_ms"]
 
-        except HTTPError:
-            _LOGGER.error("Unable to fetch data from API")
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Requests are timed on every poll, whether the state changed or not."""
+        self._update_from_data()
+        self.async_write_state_if_changed()
@@ -0,0 +1,158 @@
+"""Services sending the same command to several vacuums at once."""
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import SupportsResponse, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+
+from .const import DOMAIN, FAN_SPEED_1, FAN_SPEEDS
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_START_ALL = "start_all"
+SERVICE_HOME_ALL = "home_all"
+SERVICE_START_PLAN_ALL = "start_plan_all"
+SERVICES = [SERVICE_START_ALL, SERVICE_HOME_ALL, SERVICE_START_PLAN_ALL]
+
+ATTR_DEVICE_ID = "device_id"
+ATTR_SERIAL_NUMBER = "serial_number"
+ATTR_MODE = "mode"
+ATTR_FAN_SPEED = "fan_speed"
+ATTR_PLAN = "plan"
+
+FILTER_SCHEMA = {
+    vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_SERIAL_NUMBER): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_MODE): vol.All(cv.ensure_list, [cv.string]),
+}
+START_ALL_SCHEMA = vol.Schema(
+    {**FILTER_SCHEMA, vol.Optional(ATTR_FAN_SPEED): vol.In(FAN_SPEEDS)}
+)
+HOME_ALL_SCHEMA = vol.Schema(FILTER_SCHEMA)
+START_PLAN_ALL_SCHEMA = vol.Schema({**FILTER_SCHEMA, vol.Required(ATTR_PLAN): cv.string})
+
+
+def _select_devices(hass, call):
+    """Return the (client, device) pairs of all entries matching the filters of `call`."""
+    sns = set(call.data.get(ATTR_SERIAL_NUMBER, []))
+    device_registry = dr.async_get(hass)
+    for device_id in call.data.get(ATTR_DEVICE_ID, []):
+        device_entry = device_registry.async_get(device_id)
+        if device_entry is None:
+            continue
+        sns.update(sn for domain, sn in device_entry.identifiers if domain == DOMAIN)
+    filtered = ATTR_SERIAL_NUMBER in call.data or ATTR_DEVICE_ID in call.data
+    modes = call.data.get(ATTR_MODE)
+
+    selected = []
+    for conga_data in hass.data.get(DOMAIN, {}).values():
+        conga_client = conga_data["controller"]
+        for device in conga_data["devices"]:
+            if filtered and device["sn"] not in sns:
+                continue
+            if modes and conga_client.get_status(device["sn"]).get("mode") not in modes:
+                continue
+            selected.append((conga_client, device))
+    return selected
+
+
+async def _async_run_all(hass, call, command, skip=None):
+    """Run `command(client, sn)` on the selected vacuums and report the results.
+
+    Devices for which `skip(client, sn)` returns a reason are not sent the
+    command and are reported as failed with that reason.
+    """
+    start = time.monotonic()
+    by_client = {}
+    names = {}
+    results = {}
+    for conga_client, device in _select_devices(hass, call):
+        sn = device["sn"]
+        names[sn] = device.get("note_name")
+        reason = skip(conga_client, sn) if skip is not None else None
+        if reason is not None:
+            results[sn] = {"success": False, "latency": 0.0, "error": reason}
+            continue
+        by_client.setdefault(conga_client, []).append(sn)
+
+    # Accounts are dispatched in parallel, each bounding its own concurrency
+    for client_results in await asyncio.gather(
+        *(
+            conga_client.run_all(sns, lambda sn, c=conga_client: command(c, sn))
+            for conga_client, sns in by_client.items()
+        )
+    ):
+        results.update(client_results)
+
+    report = {
+        "devices": [
+            {ATTR_SERIAL_NUMBER: sn, "name": names[sn], **result}
+            for sn, result in results.items()
+        ],
+        "succeeded": sum(1 for result in results.values() if result["success"]),
+        "failed": sum(1 for result in results.values() if not result["success"]),
+        "duration": round(time.monotonic() - start, 3),
+    }
+    _LOGGER.info(
+        f"{call.service} sent to {len(results)} vacuums in {report['duration']}s, "
+        f"{report['failed']} failed"
+    )
+    return report
+
+
+def _fan_speed(conga_client, sn, fan_speed):
+    if fan_speed is not None:
+        return FAN_SPEEDS.index(fan_speed)
+    # Keep the fan speed each vacuum is set to
+    current = conga_client.get_status(sn).get("workNoisy")
+    if isinstance(current, int) and 0 <= current < len(FAN_SPEEDS):
+        return current
+    return FAN_SPEEDS.index(FAN_SPEED_1)
+
+
+@callback
+def async_setup_services(hass):
+    """Register the services of the integration, once for all entries."""
+    if hass.services.has_service(DOMAIN, SERVICE_START_ALL):
+        return
+
+    async def async_start_all(call):
+        fan_speed = call.data.get(ATTR_FAN_SPEED)
+        return await _async_run_all(
+            hass,
+            call,
+            lambda client, sn: client.start(sn, _fan_speed(client, sn, fan_speed)),
+        )
+
+    async def async_home_all(call):
+        return await _async_run_all(hass, call, lambda client, sn: client.home(sn))
+
+    async def async_start_plan_all(call):
+        plan = call.data[ATTR_PLAN]
+        return await _async_run_all(
+            hass,
+            call,
+            lambda client, sn: client.start_plan(sn, plan),
+            lambda client, sn: (
+                None if client.get_plan(sn, plan) is not None else f"Plan {plan} not found"
+            ),
+        )
+
+    for service, handler, schema in (
+        (SERVICE_START_ALL, async_start_all, START_ALL_SCHEMA),
+        (SERVICE_HOME_ALL, async_home_all, HOME_ALL_SCHEMA),
+        (SERVICE_START_PLAN_ALL, async_start_plan_all, START_PLAN_ALL_SCHEMA),
+    ):
+        hass.services.async_register(
+            DOMAIN, service, handler, schema, supports_response=SupportsResponse.OPTIONAL
+        )
+
+
+@callback
+def async_unload_services(hass):
+    for service in SERVICES:
+        hass.services.async_remove(DOMAIN, service)
@@ -0,0 +1,146 @@
+"""Minimal AWS Signature Version 4 signer for the IoT Data REST API."""
+import datetime
+import hashlib
+import hmac
+from urllib.parse import parse_qsl, quote, urlsplit
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _signing_key(secret_key, date_stamp, region, service):
+    key = _hmac(f"AWS4{secret_key}".encode("utf-8"), date_stamp)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    return _hmac(key, "aws4_request")
+
+
+def _canonical_query(query):
+    params = sorted(
+        (quote(k, safe="-_.~"), quote(v, safe="-_.~"))
+        for k, v in parse_qsl(query, keep_blank_values=True)
+    )
+    return "&".join(f"{k}={v}" for k, v in params)
+
+
+def sign_request(
+    method,
+    url,
+    region,
+    service,
+    access_key,
+    secret_key,
+    session_token=None,
+    body=b"",
+    headers=None,
+    now=None,
+):
+    """Return the headers needed to send a SigV4 signed request to `url`."""
+    parsed = urlsplit(url)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date_stamp = now.strftime("%Y%m%d")
+
+    signed = {k.lower(): str(v).strip() for k, v in (headers or {}).items()}
+    signed["host"] = parsed.netloc
+    signed["x-amz-date"] = amz_date
+    if session_token:
+        signed["x-amz-security-token"] = session_token
+
+    signed_headers = ";".join(sorted(signed))
+    canonical_headers = "".join(f"{k}:{signed[k]}\n" for k in sorted(signed))
+    canonical_request = "\n".join(
+        [
+            method.upper(),
+            quote(parsed.path or "/", safe="/-_.~"),
+            _canonical_query(parsed.query),
+            canonical_headers,
+            signed_headers,
+            hashlib.sha256(body).hexdigest(),
+        ]
+    )
+
+    scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(
+        [
+            ALGORITHM,
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ]
+    )
+    signature = hmac.new(
+        _signing_key(secret_key, date_stamp, region, service),
+        string_to_sign.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+
+    signed["authorization"] = (
+        f"{ALGORITHM} Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return signed
+
+
+def presign_path(
+    host,
+    path,
+    region,
+    service,
+    access_key,
+    secret_key,
+    session_token=None,
+    now=None,
+):
+    """Return `path` with a SigV4 query string signature, as used by websockets.
+
+    AWS IoT expects the session token to be appended after the signature
+    instead of being part of the signed query.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date_stamp = now.strftime("%Y%m%d")
+    scope = f"{date_stamp}/{region}/{service}/aws4_request"
+
+    query = _canonical_query(
+        "&".join(
+            f"{k}={quote(v, safe='')}"
+            for k, v in (
+                ("X-Amz-Algorithm", ALGORITHM),
+                ("X-Amz-Credential", f"{access_key}/{scope}"),
+                ("X-Amz-Date", amz_date),
+                ("X-Amz-SignedHeaders", "host"),
+            )
+        )
+    )
+    canonical_request = "\n".join(
+        [
+            "GET",
+            path,
+            query,
+            f"host:{host}\n",
+            "host",
+            hashlib.sha256(b"").hexdigest(),
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            ALGORITHM,
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ]
+    )
+    signature = hmac.new(
+        _signing_key(secret_key, date_stamp, region, service),
+        string_to_sign.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+
+    signed_path = f"{path}?{query}&X-Amz-Signature={signature}"
+    if session_token:
+        signed_path = f"{signed_path}&X-Amz-Security-Token={quote(session_token, safe='-_.~')}"
+    return signed_path
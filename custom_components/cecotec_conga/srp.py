@@ -0,0 +1,122 @@
+"""Cognito user pool SRP authentication helpers.
+
+Same computations as pycognito's AWSSRP, without its boto3 dependency.
+"""
+import base64
+import datetime
+import hashlib
+import hmac
+import os
+
+# https://github.com/aws/amazon-cognito-identity-js/blob/master/src/AuthenticationHelper.js#L22
+N_HEX = (
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+    "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+    "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+    "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
+    "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+    "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
+    "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
+    "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+    "15728E5A8AAAC42DAD33170D04507A33A85521ABDF1CBA64"
+    "ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+    "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6B"
+    "F12FFA06D98A0864D87602733EC86A64521F2B18177B200C"
+    "BBE117577A615D6C770988C0BAD946E208E24FA074E5AB31"
+    "43DB5BFCE0FD108E4B82D120A93AD2CAFFFFFFFFFFFFFFFF"
+)
+G_HEX = "2"
+INFO_BITS = bytearray("Caldera Derived Key", "utf-8")
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MONTH_NAMES = [
+    "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
+]
+
+
+def _hash_sha256(buf):
+    value = hashlib.sha256(buf).hexdigest()
+    return (64 - len(value)) * "0" + value
+
+
+def _hex_hash(hex_string):
+    return _hash_sha256(bytearray.fromhex(hex_string))
+
+
+def _pad_hex(value):
+    hex_str = value if isinstance(value, str) else f"{value:x}"
+    if len(hex_str) % 2 == 1:
+        hex_str = f"0{hex_str}"
+    elif hex_str[0] in "89ABCDEFabcdef":
+        hex_str = f"00{hex_str}"
+    return hex_str
+
+
+def _compute_hkdf(ikm, salt):
+    prk = hmac.new(salt, ikm, hashlib.sha256).digest()
+    info_bits_update = INFO_BITS + bytearray(chr(1), "utf-8")
+    return hmac.new(prk, info_bits_update, hashlib.sha256).digest()[:16]
+
+
+class CognitoSRP:
+    """Client side of the Cognito USER_SRP_AUTH flow."""
+
+    def __init__(self, username, password, pool_id):
+        self.username = username
+        self.password = password
+        self.pool_id = pool_id
+        self.big_n = int(N_HEX, 16)
+        self.val_g = int(G_HEX, 16)
+        self.val_k = int(_hex_hash("00" + N_HEX + "0" + G_HEX), 16)
+        self.small_a_value = int.from_bytes(os.urandom(128), "big") % self.big_n
+        self.large_a_value = pow(self.val_g, self.small_a_value, self.big_n)
+
+    def auth_parameters(self):
+        return {"USERNAME": self.username, "SRP_A": f"{self.large_a_value:x}"}
+
+    def password_verifier(self, challenge):
+        """Answer a Cognito PASSWORD_VERIFIER challenge."""
+        user_id_for_srp = challenge["USER_ID_FOR_SRP"]
+        secret_block = challenge["SECRET_BLOCK"]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        timestamp = (
+            f"{WEEKDAY_NAMES[now.weekday()]} {MONTH_NAMES[now.month - 1]} {now.day:d} "
+            f"{now.hour:02d}:{now.minute:02d}:{now.second:02d} UTC {now.year:d}"
+        )
+
+        hkdf = self._authentication_key(
+            user_id_for_srp, int(challenge["SRP_B"], 16), challenge["SALT"]
+        )
+        msg = (
+            bytearray(self.pool_id.split("_")[1], "utf-8")
+            + bytearray(user_id_for_srp, "utf-8")
+            + bytearray(base64.standard_b64decode(secret_block))
+            + bytearray(timestamp, "utf-8")
+        )
+        signature = hmac.new(hkdf, msg, digestmod=hashlib.sha256).digest()
+
+        return {
+            "TIMESTAMP": timestamp,
+            "USERNAME": challenge.get("USERNAME", self.username),
+            "PASSWORD_CLAIM_SECRET_BLOCK": secret_block,
+            "PASSWORD_CLAIM_SIGNATURE": base64.standard_b64encode(signature).decode("utf-8"),
+        }
+
+    def _authentication_key(self, username, server_b_value, salt):
+        u_value = int(_hex_hash(_pad_hex(self.large_a_value) + _pad_hex(server_b_value)), 16)
+        if u_value == 0:
+            raise ValueError("U cannot be zero.")
+        username_password = f"{self.pool_id.split('_')[1]}{username}:{self.password}"
+        username_password_hash = _hash_sha256(username_password.encode("utf-8"))
+
+        x_value = int(_hex_hash(_pad_hex(salt) + username_password_hash), 16)
+        g_mod_pow_xn = pow(self.val_g, x_value, self.big_n)
+        int_value2 = server_b_value - self.val_k * g_mod_pow_xn
+        s_value = pow(int_value2, self.small_a_value + u_value * x_value, self.big_n)
+        return _compute_hkdf(
+            bytearray.fromhex(_pad_hex(s_value)),
+            bytearray.fromhex(_pad_hex(f"{u_value:x}")),
+        )
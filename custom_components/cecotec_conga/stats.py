@@ -0,0 +1,102 @@
+"""Counters describing how the Conga clients reuse connections and batch commands."""
+
+
+class ConnectionStats:
+    """Connection reuse and credential rotation counters of a Conga client.
+
+    Connection counters are fed by the aiohttp trace config of AsyncConga.
+    Credentials rotate without rebuilding the session or its connections.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.credential_rotations = 0
+
+    def trace_config(self):
+        """Return an aiohttp TraceConfig feeding the connection counters."""
+        import aiohttp  # Only AsyncConga needs aiohttp
+
+        async def _on_request_start(session, context, params):
+            self.requests += 1
+
+        async def _on_connection_create_end(session, context, params):
+            self.connections_created += 1
+
+        async def _on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        return trace_config
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "credential_rotations": self.credential_rotations,
+        }
+
+
+class CommandStats:
+    """Batching counters of the commands sent through a CommandQueue.
+
+    A batch is one shadow update, carrying one action or several merged
+    setting changes. Latencies go from queueing a command to the cloud
+    acknowledging the update that carried it.
+    """
+
+    def __init__(self):
+        self.commands = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def average_batch_size(self):
+        if self.batches == 0:
+            return 0.0
+        return self.commands / self.batches
+
+    @property
+    def average_latency(self):
+        if self.commands == 0:
+            return 0.0
+        return self.latency_total / self.commands
+
+    def record_batch(self, latencies):
+        self.commands += len(latencies)
+        self.batches += 1
+        self.max_batch_size = max(self.max_batch_size, len(latencies))
+        self.latency_total += sum(latencies)
+        self.latency_max = max(self.latency_max, *latencies)
+
+    def as_dict(self):
+        return {
+            "commands": self.commands,
+            "batches": self.batches,
+            "average_batch_size": round(self.average_batch_size, 2),
+            "max_batch_size": self.max_batch_size,
+            "average_latency": round(self.average_latency, 3),
+            "max_latency": round(self.latency_max, 3),
+        }
+
+
+class ShadowStats:
+    """Shadow refreshes that changed the cached state and ones that did not.
+
+    A refresh is skipped when the versions of both shadows of a device are
+    the ones already cached, in which case neither document is parsed.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.skipped = 0
+
+    def as_dict(self):
+        return {"processed": self.processed, "skipped": self.skipped}
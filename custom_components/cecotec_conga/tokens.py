@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+from .conga import (
+    AWS_REGION,
+    COGNITO_CLIENT_ID,
+    COGNITO_IDENTITY_POOL_ID,
+    COGNITO_LOGIN_PROVIDER,
+    COGNITO_USER_POOL_ID,
+)
+from .encoding import loads
+from .metrics import Metrics
+from .srp import CognitoSRP
+
+_LOGGER = logging.getLogger(__name__)
+
+COGNITO_IDP_URL = os.environ.get(
+    "COGNITO_IDP_URL", f"https://cognito-idp.{AWS_REGION}.amazonaws.com/"
+)
+COGNITO_IDENTITY_URL = os.environ.get(
+    "COGNITO_IDENTITY_URL", f"https://cognito-identity.{AWS_REGION}.amazonaws.com/"
+)
+# Seconds of validity a token must have left to be handed out
+TOKEN_EXPIRATION_MARGIN = 60
+# Seconds before expiration at which credentials are renewed in the background
+TOKEN_REFRESH_AHEAD = 300
+# Seconds to wait before retrying a failed background refresh
+TOKEN_REFRESH_RETRY = 60
+
+
+class CongaAuthError(Exception):
+    """Raised when Cognito refuses the account credentials."""
+
+
+class CongaTokenManager:
+    """Keep the Cognito tokens and AWS credentials of an account valid.
+
+    ID tokens are renewed with the refresh token, falling back to a full SRP
+    login only when Cognito rejects it. Credentials are renewed in the
+    background before they expire, concurrent callers wait for the same
+    refresh, and when a `store` (anything with `async_load`/`async_save`,
+    such as a Home Assistant `Store`) is given, tokens survive restarts.
+    """
+
+    def __init__(
+        self, username, password, get_session, store=None, stats=None, metrics=None
+    ):
+        self._username = username
+        self._password = password
+        self._get_session = get_session
+        self._store = store
+        self._stats = stats
+        self._metrics = metrics or Metrics()
+        self._load_task = None
+        self._id_token = None
+        self._id_token_expiration = 0
+        self._refresh_token = None
+        self._identity_id = None
+        self._credentials = None
+        self._id_token_lock = asyncio.Lock()
+        self._credentials_lock = asyncio.Lock()
+        self._refresh_handle = None
+        self._refresh_task = None
+
+    @property
+    def identity_id(self):
+        return self._identity_id
+
+    def close(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def async_get_id_token(self, min_validity=TOKEN_EXPIRATION_MARGIN):
+        async with self._id_token_lock:
+            await self._async_load()
+            if self._id_token is not None and self._valid_for(
+                self._id_token_expiration, min_validity
+            ):
+                return self._id_token
+
+            tokens = None
+            if self._refresh_token is not None:
+                try:
+                    tokens = await self._refresh_tokens()
+                except CongaAuthError:
+                    _LOGGER.info("Cecotec Conga refresh token rejected, logging in again")
+            if tokens is None:
+                tokens = await self._login()
+
+            self._id_token = tokens["IdToken"]
+            self._id_token_expiration = time.time() + tokens["ExpiresIn"]
+            self._refresh_token = tokens.get("RefreshToken", self._refresh_token)
+            await self._async_save()
+            return self._id_token
+
+    async def async_get_credentials(self, min_validity=TOKEN_EXPIRATION_MARGIN):
+        async with self._credentials_lock:
+            await self._async_load()
+            if self._credentials is not None and self._valid_for(
+                self._credentials["Expiration"], min_validity
+            ):
+                self._schedule_refresh()
+                return self._credentials
+
+            _LOGGER.info("Refreshing Cecotec Conga token")
+            logins = {
+                COGNITO_LOGIN_PROVIDER: await self.async_get_id_token(min_validity)
+            }
+            if self._identity_id is None:
+                identity = await self._cognito_request(
+                    COGNITO_IDENTITY_URL,
+                    "AWSCognitoIdentityService.GetId",
+                    {"IdentityPoolId": COGNITO_IDENTITY_POOL_ID, "Logins": logins},
+                )
+                self._identity_id = identity["IdentityId"]
+            try:
+                creds = await self._cognito_request(
+                    COGNITO_IDENTITY_URL,
+                    "AWSCognitoIdentityService.GetCredentialsForIdentity",
+                    {"IdentityId": self._identity_id, "Logins": logins},
+                )
+            except CongaAuthError:
+                # A persisted identity may no longer be valid, look it up again next time
+                self._identity_id = None
+                raise
+            if self._credentials is not None and self._stats is not None:
+                self._stats.credential_rotations += 1
+            self._credentials = creds["Credentials"]
+            await self._async_save()
+            self._schedule_refresh()
+            return self._credentials
+
+    @staticmethod
+    def _valid_for(expiration, seconds):
+        return time.time() + seconds < expiration
+
+    def _schedule_refresh(self):
+        if self._refresh_handle is not None or self._refresh_task is not None:
+            return
+        delay = self._credentials["Expiration"] - TOKEN_REFRESH_AHEAD - time.time()
+        self._refresh_handle = asyncio.get_running_loop().call_later(
+            max(delay, 0), self._start_refresh
+        )
+
+    def _start_refresh(self):
+        self._refresh_handle = None
+        self._refresh_task = asyncio.get_running_loop().create_task(
+            self._background_refresh()
+        )
+
+    async def _background_refresh(self):
+        try:
+            await self.async_get_credentials(TOKEN_REFRESH_AHEAD)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning(f"Unable to refresh Cecotec Conga token: {err}")
+            self._refresh_task = None
+            self._refresh_handle = asyncio.get_running_loop().call_later(
+                TOKEN_REFRESH_RETRY, self._start_refresh
+            )
+            return
+        self._refresh_task = None
+        self._schedule_refresh()
+
+    async def _async_load(self):
+        if self._store is None:
+            return
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(self._load())
+        await self._load_task
+
+    async def _load(self):
+        data = await self._store.async_load()
+        if not data or data.get("username") != self._username:
+            return
+        self._id_token = data.get("id_token")
+        self._id_token_expiration = data.get("id_token_expiration", 0)
+        self._refresh_token = data.get("refresh_token")
+        self._identity_id = data.get("identity_id")
+        self._credentials = data.get("credentials")
+
+    async def _async_save(self):
+        if self._store is None:
+            return
+        await self._store.async_save(
+            {
+                "username": self._username,
+                "id_token": self._id_token,
+                "id_token_expiration": self._id_token_expiration,
+                "refresh_token": self._refresh_token,
+                "identity_id": self._identity_id,
+                "credentials": self._credentials,
+            }
+        )
+
+    async def _refresh_tokens(self):
+        result = await self._cognito_request(
+            COGNITO_IDP_URL,
+            "AWSCognitoIdentityProviderService.InitiateAuth",
+            {
+                "AuthFlow": "REFRESH_TOKEN_AUTH",
+                "ClientId": COGNITO_CLIENT_ID,
+                "AuthParameters": {"REFRESH_TOKEN": self._refresh_token},
+            },
+        )
+        return _authentication_result(result)
+
+    async def _login(self):
+        srp = CognitoSRP(self._username, self._password, COGNITO_USER_POOL_ID)
+        auth = await self._cognito_request(
+            COGNITO_IDP_URL,
+            "AWSCognitoIdentityProviderService.InitiateAuth",
+            {
+                "AuthFlow": "USER_SRP_AUTH",
+                "ClientId": COGNITO_CLIENT_ID,
+                "AuthParameters": srp.auth_parameters(),
+            },
+        )
+        if auth.get("ChallengeName") != "PASSWORD_VERIFIER":
+            raise CongaAuthError(f"Unsupported challenge {auth.get('ChallengeName')}")
+
+        result = await self._cognito_request(
+            COGNITO_IDP_URL,
+            "AWSCognitoIdentityProviderService.RespondToAuthChallenge",
+            {
+                "ClientId": COGNITO_CLIENT_ID,
+                "ChallengeName": "PASSWORD_VERIFIER",
+                "ChallengeResponses": srp.password_verifier(auth["ChallengeParameters"]),
+            },
+        )
+        return _authentication_result(result)
+
+    async def _cognito_request(self, url, target, payload):
+        # Timed per action, such as InitiateAuth or GetCredentialsForIdentity
+        with self._metrics.timer(target.rsplit(".", 1)[-1]):
+            return await self._cognito_request_once(url, target, payload)
+
+    async def _cognito_request_once(self, url, target, payload):
+        async with self._get_session().post(
+            url,
+            data=json.dumps(payload),
+            headers={
+                "Content-Type": "application/x-amz-json-1.1",
+                "X-Amz-Target": target,
+            },
+        ) as response:
+            if response.status == 400:
+                # Refused credentials are told apart by the error type in the body
+                error = _decode(await response.read())
+                if error is not None and error.get("__type", "").endswith(
+                    "NotAuthorizedException"
+                ):
+                    raise CongaAuthError(error.get("message"))
+            response.raise_for_status()
+            body = _decode(await response.read())
+            if body is None:
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=f"Invalid response to {target}",
+                    headers=response.headers,
+                )
+            return body
+
+
+def _decode(body):
+    """Return the JSON object in `body`, None if it holds anything else."""
+    try:
+        decoded = loads(body)
+    except ValueError:
+        return None
+    return decoded if isinstance(decoded, dict) else None
+
+
+def _authentication_result(result):
+    """Return the tokens of a Cognito answer, which may ask for another challenge."""
+    if "AuthenticationResult" not in result:
+        # New passwords or MFA codes can't be given without the user
+        raise CongaAuthError(f"Unsupported challenge {result.get('ChallengeName')}")
+    return result["AuthenticationResult"]
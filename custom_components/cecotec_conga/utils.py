@@ -1,4 +1,5 @@
 import logging
+from homeassistant.core import callback
 from homeassistant.helpers.entity import DeviceInfo
 
 from .const import (
@@ -18,3 +19,41 @@ def build_device_info(name, sn) -> DeviceInfo:
         model=MODEL,
         sw_version="Not provided",
     )
+
+
+@callback
+def async_track_reported_keys(config_entry, conga_data, keys, async_add_keys):
+    """Call `async_add_keys(device, new_keys)` as devices first report any of `keys`.
+
+    Devices are checked once right away, then only for the keys changed by
+    every coordinator update. Keys of removed devices are forgotten, so a
+    device added again gets its entities back.
+    """
+    coordinator = conga_data["coordinator"]
+    seen = set()
+
+    @callback
+    def async_forget(added, removed):
+        removed_sns = {device["sn"] for device in removed}
+        seen.difference_update({item for item in seen if item[0] in removed_sns})
+
+    @callback
+    def async_check(initial=False):
+        for device in conga_data["devices"]:
+            sn = device["sn"]
+            data = (coordinator.data or {}).get(sn)
+            if data is None:
+                continue
+            candidates = data["status"] if initial else coordinator.changed.get(sn, ())
+            new_keys = [
+                key
+                for key in keys
+                if key in candidates and key in data["status"] and (sn, key) not in seen
+            ]
+            if new_keys:
+                seen.update((sn, key) for key in new_keys)
+                async_add_keys(device, new_keys)
+
+    async_check(initial=True)
+    config_entry.async_on_unload(coordinator.async_add_listener(async_check))
+    config_entry.async_on_unload(coordinator.add_device_listener(async_forget))
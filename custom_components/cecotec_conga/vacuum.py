@@ -1,10 +1,7 @@
 from __future__ import annotations
 
-from datetime import timedelta
 import logging
 
-from requests import HTTPError
-
 from homeassistant.components.vacuum import (
     STATE_CLEANING,
     STATE_DOCKED,
@@ -18,7 +15,7 @@ from homeassistant.components.vacuum import (
 from homeassistant.const import (
     STATE_OFF,
 )
-from homeassistant.util import Throttle
+from homeassistant.core import callback
 from homeassistant.helpers.entity import DeviceInfo
 
 from .utils import build_device_info
@@ -28,14 +25,10 @@ from .const import (
     BRAND,
     DOMAIN,
     MODEL,
-    FAN_SPEED_0,
     FAN_SPEED_1,
-    FAN_SPEED_2,
-    FAN_SPEED_3,
-    WATER_LEVEL_0,
+    FAN_SPEEDS,
     WATER_LEVEL_1,
-    WATER_LEVEL_2,
-    WATER_LEVEL_3,
+    WATER_LEVELS,
 )
 
 SUPPORTED_FEATURES = (
@@ -57,32 +50,48 @@ ATTR_NAME = "Name"
 ATTR_PLANS = "plans"
 ATTR_WATER_LEVELS = "water_levels"
 
-FAN_SPEEDS = [FAN_SPEED_0, FAN_SPEED_1, FAN_SPEED_2, FAN_SPEED_3]
+# Device data the vacuum entity is built from
+VACUUM_KEYS = ("elec", "mode", "workNoisy", "plans")
 
-WATER_LEVELS = [WATER_LEVEL_0, WATER_LEVEL_1, WATER_LEVEL_2, WATER_LEVEL_3]
+# Vacuum state of each robot mode, any other mode being an error
+MODE_STATES = {
+    "sweep": STATE_CLEANING,
+    "backcharge": STATE_RETURNING,
+    "DustCenterWorking": STATE_RETURNING,
+    "fullcharge": STATE_DOCKED,
+    "charge": STATE_DOCKED,
+    "pause": STATE_PAUSED,
+    "idle": STATE_IDLE,
+    "shutdown": STATE_OFF,
+}
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(seconds=60)
+# Battery icon suffix of every ten percent of charge
+BATTERY_ICONS = [
+    "-outline", "-10", "-20", "-30", "-40", "-50", "-60", "-70", "-80", "-90", "-100"
+]
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the Cecotec Conga sensor from a config entry."""
-    entities = []
-
-    devices = hass.data[DOMAIN][config_entry.entry_id]["devices"]
-
-    for device in devices:
-        conga_data = hass.data[DOMAIN][config_entry.entry_id]
-        entities.append(
-            CongaVacuum(
-                conga_data,
-                device["note_name"],
-                device["sn"],
-            )
-        )
-
-    hass.data[DOMAIN][config_entry.entry_id]["entities"] = entities
-
-    async_add_entities(entities, update_before_add=True)
+    conga_data = hass.data[DOMAIN][config_entry.entry_id]
+
+    @callback
+    def async_add_devices(devices, removed=()):
+        entities = [
+            CongaVacuum(conga_data, device["note_name"], device["sn"])
+            for device in devices
+        ]
+        removed_sns = {device["sn"] for device in removed}
+        conga_data["entities"] = [
+            entity for entity in conga_data["entities"] if entity._sn not in removed_sns
+        ] + entities
+        if entities:
+            async_add_entities(entities)
+
+    async_add_devices(conga_data["devices"])
+    config_entry.async_on_unload(
+        conga_data["coordinator"].add_device_listener(async_add_devices)
+    )
 
 
 class CongaVacuum(StateVacuumEntity, CongaEntity):
@@ -96,6 +105,9 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
         self._sn = sn
         self._battery = 0
         self._state = "loading"
+        self._vacuum_state = STATE_ERROR
+        self._battery_icon = f"mdi:battery{BATTERY_ICONS[0]}"
+        self._attributes = {}
         self._state_all = {}
         self._plans = []
         self._water_levels = WATER_LEVELS
@@ -105,6 +117,7 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
         self._supported_features = SUPPORTED_FEATURES
         CongaEntity.__init__(self, conga_data, name, sn)
         StateVacuumEntity.__init__(self)
+        self._update_from_data()
 
     @property
     def name(self):
@@ -136,21 +149,7 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
     @property
     def state(self):
         """Return the vacuum status."""
-        if self._state == "sweep":
-            return STATE_CLEANING
-        elif self._state == "backcharge" or self._state == "DustCenterWorking":
-            return STATE_RETURNING
-        elif self._state == "fullcharge" or self._state == "charge":
-            return STATE_DOCKED
-        elif self._state == "pause":
-            return STATE_PAUSED
-        elif self._state == "idle":
-            return STATE_IDLE
-        elif self._state == "shutdown":
-            return STATE_OFF
-        else:
-            _LOGGER.warn(f"Unknown status: {self._state}")
-            return STATE_ERROR
+        return self._vacuum_state
 
     @property
     def battery_level(self):
@@ -160,42 +159,12 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
     @property
     def battery_icon(self):
         """Return the battery icon for the vacuum cleaner."""
-        charging = ""
-        if self._state == "charge":
-            charging = "-charging"
-
-        battery = "-100"
-        if self._battery < 10:
-            battery = "-outline"
-        elif self._battery < 20:
-            battery = "-10"
-        elif self._battery < 30:
-            battery = "-20"
-        elif self._battery < 40:
-            battery = "-30"
-        elif self._battery < 50:
-            battery = "-40"
-        elif self._battery < 60:
-            battery = "-50"
-        elif self._battery < 70:
-            battery = "-60"
-        elif self._battery < 80:
-            battery = "-70"
-        elif self._battery < 90:
-            battery = "-80"
-        elif self._battery < 100:
-            battery = "-90"
-        return f"mdi:battery{charging}{battery}"
+        return self._battery_icon
 
     @property
     def extra_state_attributes(self):
         """Return some attributes."""
-        return {
-            ATTR_SN: self._sn,
-            ATTR_NAME: self._name,
-            ATTR_PLANS: ",".join(self._plans),
-            ATTR_WATER_LEVELS: ",".join(self._water_levels),
-        }
+        return self._attributes
 
     @property
     def fan_speed(self):
@@ -212,51 +181,55 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
         """Flag supported features."""
         return self._supported_features
 
-    def start(self):
+    async def async_start(self):
         """Start or resume the cleaning task."""
-        self.turn_on()
+        await self.async_turn_on()
 
-    def turn_on(self, **kwargs):
+    async def async_turn_on(self, **kwargs):
         """Turn the vacuum on."""
-        self._conga_client.start(self._sn, self._fan_speeds.index(self._fan_speed))
-        self.schedule_update_ha_state()
+        await self._conga_client.start(
+            self._sn, self._fan_speeds.index(self._fan_speed)
+        )
+        self.async_write_state_if_changed()
 
-    def turn_off(self, **kwargs):
+    async def async_turn_off(self, **kwargs):
         """Turn off the vacuum."""
-        self.return_to_base()
+        await self.async_return_to_base()
 
-    def return_to_base(self, **kwargs):
+    async def async_return_to_base(self, **kwargs):
         """Ask vacuum to go home."""
-        self._conga_client.home(self._sn)
-        self.schedule_update_ha_state()
+        await self._conga_client.home(self._sn)
+        self.async_write_state_if_changed()
 
-    def set_fan_speed(self, fan_speed, **kwargs):
+    async def async_set_fan_speed(self, fan_speed, **kwargs):
         """Set fan speed."""
 
         _LOGGER.info(f"Setting fan speed to {fan_speed}")
 
-        self._conga_client.set_fan_speed(self._sn, self._fan_speeds.index(fan_speed))
+        await self._conga_client.set_fan_speed(
+            self._sn, self._fan_speeds.index(fan_speed)
+        )
         self._fan_speed = fan_speed
-        self.schedule_update_ha_state()
+        self.async_write_state_if_changed()
 
-    def send_command(self, command, params=None, **kwargs):
+    async def async_send_command(self, command, params=None, **kwargs):
         """Send raw command."""
         _LOGGER.info(f"Sending command {command} with params {params}")
 
         if command == "start_plan":
             plan = params["plan"]
-            if plan in self._plans:
-                self._conga_client.start_plan(self._sn, plan)
-                self.schedule_update_ha_state()
+            if self._conga_client.get_plan(self._sn, plan) is not None:
+                await self._conga_client.start_plan(self._sn, plan)
+                self.async_write_state_if_changed()
             else:
                 _LOGGER.error(f"Plan {plan} not found. Allowed plans: {self._plans}")
         elif command == "set_water_level":
             water_level = params["water_level"]
             if water_level in self._water_levels:
-                self._conga_client.set_water_level(
+                await self._conga_client.set_water_level(
                     self._sn, self._water_levels.index(water_level)
                 )
-                self.schedule_update_ha_state()
+                self.async_write_state_if_changed()
             else:
                 _LOGGER.error(
                     f"Invalid water level: {water_level}. Allowed water levels: {self._water_levels}"
@@ -264,15 +237,53 @@ class CongaVacuum(StateVacuumEntity, CongaEntity):
         else:
             _LOGGER.error(f"Unknown command {command}")
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Get the next bus information."""
-        try:
-            self._conga_client.update_shadows(self._sn)
-            self._state_all = self._conga_client.get_status()
-
-            self._battery = self._state_all["elec"]
-            self._state = self._state_all["mode"]
-            self._plans = self._conga_client.list_plans()
-        except HTTPError:
-            _LOGGER.error("Unable to fetch data from API")
+    def state_snapshot(self):
+        return (
+            self._vacuum_state,
+            self._battery,
+            self._battery_icon,
+            self._fan_speed,
+            self._attributes,
+        )
+
+    def _update_from_data(self):
+        # Everything shown is derived here once per change, not on every read
+        data = self.device_data
+        if not data:
+            self._attributes = self._build_attributes()
+            return
+
+        self._state_all = data["status"]
+        self._battery = self._state_all["elec"]
+        mode = self._state_all["mode"]
+        if mode != self._state and mode not in MODE_STATES:
+            _LOGGER.warning(f"Unknown status: {mode}")
+        self._state = mode
+        self._vacuum_state = MODE_STATES.get(mode, STATE_ERROR)
+        if isinstance(self._battery, int):
+            battery = BATTERY_ICONS[min(max(self._battery, 0) // 10, len(BATTERY_ICONS) - 1)]
+        else:
+            battery = BATTERY_ICONS[0]
+        charging = "-charging" if mode == "charge" else ""
+        self._battery_icon = f"mdi:battery{charging}{battery}"
+        self._plans = data["plans"]
+        fan_speed = self._state_all.get("workNoisy")
+        if isinstance(fan_speed, int) and 0 <= fan_speed < len(self._fan_speeds):
+            self._fan_speed = self._fan_speeds[fan_speed]
+        self._attributes = self._build_attributes()
+
+    def _build_attributes(self):
+        return {
+            ATTR_SN: self._sn,
+            ATTR_NAME: self._name,
+            ATTR_PLANS: ",".join(self._plans),
+            ATTR_WATER_LEVELS: ",".join(self._water_levels),
+        }
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if not self.device_changed(VACUUM_KEYS):
+            return
+        self._update_from_data()
+        self.async_write_state_if_changed()
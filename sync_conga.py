@@ -0,0 +1,284 @@
+"""Blocking Conga client built on boto3, pycognito and requests.
+
+Only test.py uses it, the integration talks to the cloud through AsyncConga.
+Its dependencies are installed with `pipenv install`, they are not
+requirements of the integration.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+
+from custom_components.cecotec_conga.conga import (
+    AWS_IOT_ENDPOINT,
+    AWS_REGION,
+    CECOTEC_API_BASE_URL,
+    COGNITO_CLIENT_ID,
+    COGNITO_IDENTITY_POOL_ID,
+    COGNITO_LOGIN_PROVIDER,
+    COGNITO_USER_POOL_ID,
+    CongaBase,
+)
+from custom_components.cecotec_conga.stats import ConnectionStats
+
+# boto3, pycognito and requests are slow to import, so they are imported on
+# first use instead of here.
+
+_LOGGER = logging.getLogger(__name__)
+
+# Shadow requests Conga runs at the same time
+MAX_WORKERS = 8
+
+
+def _cognito_credential_provider(fetch_credentials):
+    """Return a botocore credential provider for the Cognito identity credentials.
+
+    Credentials are fetched on first use and renewed by botocore before
+    they expire, so clients built on the session are never rebuilt.
+    """
+    from botocore.credentials import CredentialProvider, DeferredRefreshableCredentials
+
+    class CognitoCredentialProvider(CredentialProvider):
+        METHOD = "cecotec-conga"
+        CANONICAL_NAME = "custom-cecotec-conga"
+
+        def load(self):
+            return DeferredRefreshableCredentials(fetch_credentials, self.METHOD)
+
+    return CognitoCredentialProvider()
+
+
+class Conga(CongaBase):
+    def __init__(self, username, password):
+        super().__init__(username, password)
+        self.stats = ConnectionStats()
+        self._http = None
+        self._boto_session = None
+        self._cognito = None
+        self._cognito_identity = None
+        self._identity_id = None
+        self._credentials_fetched = False
+        self._api_token = None
+        self._iot_client = None
+        self._executor = None
+
+    def list_vacuums(self):
+        self._refresh_api_token()
+        self.rate_limiter.acquire()
+        devices = self._get_http().post(
+            f"{CECOTEC_API_BASE_URL}/api/user_machine/list",
+            json={},
+            auth=self._api_token,
+        )
+        devices.raise_for_status()
+        self._devices = devices.json()["data"]["page_items"]
+        _LOGGER.debug(self._devices)
+        return self._devices
+
+    def update_shadows(self, sn, max_age=None):
+        """Fetch the shadows of a device and return its reported state.
+
+        When `max_age` (in seconds) is given and the cached shadows of `sn`
+        are younger than that, the cached state is returned without fetching.
+        """
+        results, errors = self.update_all_shadows([sn], max_age)
+        if sn in errors:
+            raise errors[sn]
+        return results[sn]
+
+    def update_all_shadows(self, sns, max_age=None):
+        """Fetch the shadows of several devices in parallel.
+
+        Returns a tuple with the reported state of every device that could be
+        fetched and the error raised for every device that could not, both
+        keyed by serial number.
+        """
+        results = {}
+        errors = {}
+        to_fetch = []
+        for sn in sns:
+            cache = self._get_cached_shadows(sn, max_age)
+            if cache is not None:
+                results[sn] = cache.reported
+            else:
+                to_fetch.append(sn)
+        if not to_fetch:
+            return results, errors
+
+        self._refresh_iot_client()
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                MAX_WORKERS, thread_name_prefix="conga"
+            )
+        futures = {
+            sn: (
+                self._executor.submit(self._get_thing_shadow, sn),
+                self._executor.submit(self._get_thing_shadow, sn, "service"),
+            )
+            for sn in to_fetch
+        }
+        for sn, (shadow, shadow_service) in futures.items():
+            try:
+                results[sn] = self._store_shadows(
+                    sn, shadow.result(), shadow_service.result()
+                )
+            except (BotoCoreError, ClientError) as err:
+                errors[sn] = err
+        return results, errors
+
+    def start(self, sn, fan_speed):
+        self._started_plans.pop(sn, None)
+        self._send_payload(sn, self._start_payload(fan_speed))
+
+    def set_fan_speed(self, sn, level):
+        payload = self._fan_speed_payload(level)
+        _LOGGER.debug(payload)
+        self._refresh_iot_client()
+        self.rate_limiter.acquire()
+        self._iot_client.update_thing_shadow(
+            thingName=sn, payload=bytes(json.dumps(payload), "ascii")
+        )
+
+    def set_water_level(self, sn, level):
+        payload = self._water_level_payload(level)
+        _LOGGER.debug(payload)
+        self._refresh_iot_client()
+        self.rate_limiter.acquire()
+        self._iot_client.update_thing_shadow(
+            thingName=sn, payload=bytes(json.dumps(payload), "ascii")
+        )
+
+    def start_plan(self, sn, plan_name):
+        _LOGGER.info(f"Starting plan {plan_name} on {sn}")
+        if sn not in self._shadows:
+            self.update_shadows(sn)
+        payload = self._start_plan_payload(self._get_plan_details(sn, plan_name))
+        _LOGGER.debug(payload)
+        self._started_plans[sn] = plan_name
+        self._send_payload(sn, payload)
+
+    def home(self, sn):
+        self._send_payload(sn, self._home_payload())
+
+    def _get_thing_shadow(self, sn, shadow_name=None):
+        self.rate_limiter.acquire()
+        if shadow_name is None:
+            shadow = self._iot_client.get_thing_shadow(thingName=sn)
+        else:
+            shadow = self._iot_client.get_thing_shadow(
+                thingName=sn, shadowName=shadow_name
+            )
+        return shadow["payload"].read()
+
+    def _send_payload(self, sn, payload):
+        _LOGGER.debug(payload)
+        self._refresh_iot_client()
+        self.rate_limiter.acquire()
+        self._iot_client.update_thing_shadow(
+            thingName=sn,
+            shadowName="service",
+            payload=bytes(json.dumps(payload), "ascii"),
+        )
+
+    def _count_request(self, *args, **kwargs):
+        self.stats.requests += 1
+
+    def _get_http(self):
+        if self._http is None:
+            import requests
+
+            self._http = requests.Session()
+            self._http.hooks["response"].append(self._count_request)
+        return self._http
+
+    def _refresh_api_token(self):
+        if self._api_token != None:
+            return self._api_token
+
+        from pycognito.utils import RequestsSrpAuth
+
+        self._api_token = RequestsSrpAuth(
+            password=self._password, cognito=self._get_cognito()
+        )
+
+    def _get_boto_session(self):
+        if self._boto_session is not None:
+            return self._boto_session
+
+        import boto3
+        import botocore.session
+
+        botocore_session = botocore.session.get_session()
+        botocore_session.get_component("credential_provider").insert_before(
+            "env", _cognito_credential_provider(self._fetch_iot_credentials)
+        )
+        self._boto_session = boto3.Session(
+            botocore_session=botocore_session, region_name=AWS_REGION
+        )
+        return self._boto_session
+
+    def _get_cognito(self):
+        if self._cognito is None:
+            from botocore import UNSIGNED
+            from botocore.config import Config
+            from pycognito import Cognito
+
+            self._cognito = Cognito(
+                COGNITO_USER_POOL_ID,
+                COGNITO_CLIENT_ID,
+                username=self._username,
+                session=self._get_boto_session(),
+                boto3_client_kwargs={"config": Config(signature_version=UNSIGNED)},
+            )
+        return self._cognito
+
+    def _get_id_token(self):
+        from botocore.exceptions import ClientError
+
+        cognito = self._get_cognito()
+        if cognito.refresh_token is not None:
+            try:
+                cognito.renew_access_token()
+                return cognito.id_token
+            except ClientError:
+                _LOGGER.info("Cecotec Conga refresh token rejected, logging in again")
+        cognito.authenticate(password=self._password)
+        return cognito.id_token
+
+    def _fetch_iot_credentials(self):
+        _LOGGER.info("Refreshing Cecotec Conga token")
+        logins = {COGNITO_LOGIN_PROVIDER: self._get_id_token()}
+        if self._identity_id is None:
+            response = self._cognito_identity.get_id(
+                IdentityPoolId=COGNITO_IDENTITY_POOL_ID, Logins=logins
+            )
+            self._identity_id = response["IdentityId"]
+        creds = self._cognito_identity.get_credentials_for_identity(
+            IdentityId=self._identity_id, Logins=logins
+        )["Credentials"]
+
+        if self._credentials_fetched:
+            self.stats.credential_rotations += 1
+        self._credentials_fetched = True
+        return {
+            "access_key": creds["AccessKeyId"],
+            "secret_key": creds["SecretKey"],
+            "token": creds["SessionToken"],
+            "expiry_time": creds["Expiration"].isoformat(),
+        }
+
+    def _refresh_iot_client(self):
+        if self._iot_client != None:
+            return self._iot_client
+
+        from botocore import UNSIGNED
+        from botocore.config import Config
+
+        session = self._get_boto_session()
+        self._cognito_identity = session.client(
+            "cognito-identity", config=Config(signature_version=UNSIGNED)
+        )
+        self._iot_client = session.client("iot-data", endpoint_url=AWS_IOT_ENDPOINT)
+        self._iot_client.meta.events.register("before-send", self._count_request)
+        return self._iot_client
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from custom_components.cecotec_conga.conga import Conga
+from sync_conga import Conga
 
 load_dotenv()
 
@@ -14,10 +14,13 @@ conga_client = Conga(conga_username, conga_password)
 print(f"\nGetting status for {conga_sn}")
 print(conga_client.list_vacuums())
 conga_client.update_shadows(conga_sn)
-print(conga_client.get_status())
+print(conga_client.get_status(conga_sn))
 
-print(f"\nGetting plans for")
-print(conga_client.list_plans())
+print(f"\nGetting plans for {conga_sn}")
+print(conga_client.list_plans(conga_sn))
+
+print(f"\nConnection stats")
+print(conga_client.stats.as_dict())
 
 # print(f"\nStarting plan for {conga_sn}")
 # print(conga_client.start_plan(conga_sn, "Quick"))
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from custom_components.cecotec_conga.commands import CommandQueue
+from custom_components.cecotec_conga.resilience import CongaUnavailableError
+
+
+class FakeShadow:
+    """Record the shadow updates of a CommandQueue, failing them on demand."""
+
+    def __init__(self):
+        self.sent = []
+        self.errors = []
+
+    async def send(self, shadow_name, desired):
+        self.sent.append((shadow_name, dict(desired)))
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def test_settings_are_merged():
+    async def run():
+        shadow = FakeShadow()
+        queue = CommandQueue(shadow.send, window=0.01)
+        await asyncio.gather(
+            queue.async_set({"workNoisy": 1}),
+            queue.async_set({"water": 2}),
+            queue.async_set({"workNoisy": 3}),
+        )
+        return shadow.sent
+
+    assert asyncio.run(run()) == [(None, {"workNoisy": 3, "water": 2})]
+
+
+def test_action_follows_pending_settings():
+    async def run():
+        shadow = FakeShadow()
+        queue = CommandQueue(shadow.send, window=10)
+        setting = asyncio.ensure_future(queue.async_set({"water": 1}))
+        await asyncio.sleep(0)
+        await queue.async_run("service", {"startClean": {"state": 1}})
+        await setting
+        return shadow.sent
+
+    assert asyncio.run(run()) == [
+        (None, {"water": 1}),
+        ("service", {"startClean": {"state": 1}}),
+    ]
+
+
+def test_failure_only_reaches_callers_of_the_batch():
+    async def run():
+        shadow = FakeShadow()
+        shadow.errors.append(ValueError("refused"))
+        queue = CommandQueue(shadow.send, window=0.01)
+        failed = await asyncio.gather(
+            queue.async_set({"workNoisy": 1}),
+            queue.async_set({"water": 2}),
+            return_exceptions=True,
+        )
+        await queue.async_set({"water": 3})
+        return failed, shadow.sent
+
+    failed, sent = asyncio.run(run())
+    assert [type(err) for err in failed] == [ValueError, ValueError]
+    assert sent[-1] == (None, {"water": 3})
+
+
+def test_close_fails_waiting_settings():
+    async def run():
+        queue = CommandQueue(FakeShadow().send, window=10)
+        setting = asyncio.ensure_future(queue.async_set({"water": 1}))
+        await asyncio.sleep(0)
+        queue.close()
+        await setting
+
+    with pytest.raises(CongaUnavailableError):
+        asyncio.run(run())
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom_components.cecotec_conga.coordinator import (
+    BURST_UPDATE_INTERVAL,
+    MODE_UPDATE_INTERVALS,
+    POLL_TOLERANCE,
+    REMOVAL_CHECKS,
+    UPDATE_INTERVAL,
+    CongaDataUpdateCoordinator,
+)
+
+
+class FakeClient:
+    """AsyncConga stand-in answering from the statuses set in `statuses`."""
+
+    def __init__(self, sns):
+        self.statuses = {sn: {"mode": "charge"} for sn in sns}
+        self.fetched = []
+        self.listed = []
+
+    async def list_vacuums(self):
+        return [_device(sn) for sn in self.listed]
+
+    async def update_all_shadows(self, sns):
+        self.fetched.append(list(sns))
+        return {sn: True for sn in sns}, {}
+
+    def get_status(self, sn):
+        return self.statuses.get(sn, {})
+
+    def list_plans(self, sn):
+        return []
+
+
+def _device(sn):
+    return {"sn": sn, "name": sn}
+
+
+@pytest.fixture
+def hass():
+    hass = MagicMock()
+    hass.async_create_background_task.side_effect = lambda coro, name: (
+        coro.close() or MagicMock()
+    )
+    return hass
+
+
+def _coordinator(hass, sns):
+    client = FakeClient(sns)
+    coordinator = CongaDataUpdateCoordinator(hass, client, [_device(sn) for sn in sns])
+    # The device list counts as just checked
+    coordinator._devices_checked_at = time.monotonic()
+    return coordinator, client
+
+
+def test_only_due_devices_are_fetched(hass):
+    coordinator, client = _coordinator(hass, ["A", "B", "C"])
+    now = time.monotonic()
+    coordinator._next_poll = {
+        "A": now - 1,
+        "B": now + POLL_TOLERANCE / 2,
+        "C": now + 30,
+    }
+    asyncio.run(coordinator._async_update_data())
+    assert client.fetched == [["A", "B"]]
+
+
+def test_everything_is_fetched_when_nothing_is_due(hass):
+    coordinator, client = _coordinator(hass, ["A", "B"])
+    now = time.monotonic()
+    coordinator._next_poll = {"A": now + 30, "B": now + 40}
+    asyncio.run(coordinator._async_update_data())
+    assert client.fetched == [["A", "B"]]
+
+
+def test_devices_are_polled_at_the_pace_of_their_mode(hass):
+    coordinator, client = _coordinator(hass, ["A", "B"])
+    client.statuses["A"]["mode"] = "sweep"
+    client.statuses["B"]["mode"] = "unknown"
+    start = time.monotonic()
+    asyncio.run(coordinator._async_update_data())
+
+    sweep = MODE_UPDATE_INTERVALS["sweep"].total_seconds()
+    assert coordinator._next_poll["A"] - start == pytest.approx(sweep, abs=1)
+    assert coordinator._next_poll["B"] - start == pytest.approx(
+        UPDATE_INTERVAL.total_seconds(), abs=1
+    )
+    assert coordinator.update_interval.total_seconds() == pytest.approx(sweep, abs=1)
+
+
+def test_command_polls_the_device_in_burst(hass):
+    coordinator, client = _coordinator(hass, ["A", "B"])
+    asyncio.run(coordinator._async_update_data())
+
+    coordinator.async_update_from_cache("A")
+    assert hass.async_create_background_task.called
+    start = time.monotonic()
+    asyncio.run(coordinator._async_update_data())
+    assert client.fetched[-1] == ["A"]
+    assert coordinator._next_poll["A"] - start == pytest.approx(
+        BURST_UPDATE_INTERVAL.total_seconds(), abs=1
+    )
+
+
+def _check_devices(coordinator, client, sns):
+    client.listed = sns
+    asyncio.run(coordinator._async_update_devices())
+    return [device["sn"] for device in coordinator.devices]
+
+
+def test_device_is_removed_after_missing_removal_checks(hass):
+    coordinator, client = _coordinator(hass, ["A", "B"])
+    changes = []
+    coordinator.add_device_listener(
+        lambda added, removed: changes.append(
+            ([device["sn"] for device in added], [device["sn"] for device in removed])
+        )
+    )
+    for _ in range(REMOVAL_CHECKS - 1):
+        assert _check_devices(coordinator, client, ["A"]) == ["A", "B"]
+    assert changes == []
+
+    assert _check_devices(coordinator, client, ["A"]) == ["A"]
+    assert changes == [([], ["B"])]
+
+
+def test_missing_count_resets_when_device_is_listed_again(hass):
+    coordinator, client = _coordinator(hass, ["A", "B"])
+    for _ in range(REMOVAL_CHECKS - 1):
+        _check_devices(coordinator, client, ["A"])
+    _check_devices(coordinator, client, ["A", "B"])
+    for _ in range(REMOVAL_CHECKS - 1):
+        assert _check_devices(coordinator, client, ["A"]) == ["A", "B"]
+
+
+def test_empty_device_list_is_ignored(hass):
+    coordinator, client = _coordinator(hass, ["A"])
+    for _ in range(REMOVAL_CHECKS + 1):
+        assert _check_devices(coordinator, client, []) == ["A"]
+
+
+def test_new_device_is_added_right_away(hass):
+    coordinator, client = _coordinator(hass, ["A"])
+    assert _check_devices(coordinator, client, ["A", "C"]) == ["A", "C"]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from custom_components.cecotec_conga import ratelimit
+from custom_components.cecotec_conga.ratelimit import MIN_RATE, RateLimiter
+
+
+class FakeClock:
+    """Stand-in for the time module of ratelimit, sleeping moves it forward."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_burst_goes_through_then_requests_are_spaced(clock):
+    limiter = RateLimiter(rate=10, burst=3)
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.sleeps == pytest.approx([0.1, 0.1])
+    assert limiter.stats.requests == 5
+    assert limiter.stats.delayed == 2
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    limiter = RateLimiter(rate=10, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+
+    clock.now += 0.2
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == []
+
+    # A long pause only refills the bucket up to the burst
+    clock.now += 60
+    for _ in range(4):
+        limiter.acquire()
+    assert clock.sleeps == pytest.approx([0.1])
+
+
+def test_min_rate_spacing(clock):
+    limiter = RateLimiter(rate=MIN_RATE, burst=1)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == pytest.approx([1 / MIN_RATE] * 2)
+
+
+def test_zero_rate_disables_limiter(clock):
+    limiter = RateLimiter(rate=0)
+    for _ in range(100):
+        limiter.acquire()
+    assert not limiter.enabled
+    assert clock.sleeps == []
+    assert limiter.stats.requests == 0
+
+
+def test_waiting_requests_keep_their_order():
+    limiter = RateLimiter(rate=100, burst=1)
+    order = []
+
+    async def request(index):
+        await limiter.async_acquire()
+        order.append(index)
+
+    async def run():
+        await asyncio.gather(*(request(index) for index in range(5)))
+
+    asyncio.run(run())
+    assert order == list(range(5))
+    assert limiter.stats.max_queue_depth == 4
+    assert limiter.stats.queue_depth == 0
+
+
+def test_cancelled_wait_gives_back_its_token(clock):
+    limiter = RateLimiter(rate=1, burst=1)
+
+    async def run():
+        await limiter.async_acquire()
+        waiting = asyncio.ensure_future(limiter.async_acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(run())
+    assert limiter.stats.queue_depth == 0
+    # The next request only waits for the token the first one took
+    assert limiter._reserve() == pytest.approx(1 / limiter.rate)
@@ -0,0 +1,141 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from custom_components.cecotec_conga import resilience
+from custom_components.cecotec_conga.resilience import (
+    BACKOFF_BASE,
+    BACKOFF_MAX,
+    CLOSED,
+    FAILURE_THRESHOLD,
+    HALF_OPEN,
+    OPEN,
+    OPEN_TIMEOUT,
+    CongaUnavailableError,
+    RequestGuard,
+)
+
+
+def _unavailable():
+    return aiohttp.ClientResponseError(None, (), status=503)
+
+
+class FakeRequest:
+    """Request failing `failures` times with a 503 before succeeding."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _unavailable()
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the backoffs of RequestGuard instead of sleeping, jitter at its upper bound."""
+    recorded = []
+
+    async def sleep(delay):
+        recorded.append(delay)
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", sleep)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    return recorded
+
+
+def test_backoff_starts_at_base_and_doubles(sleeps):
+    request = FakeRequest(failures=2)
+    assert asyncio.run(RequestGuard().async_call(request)) == "ok"
+    assert sleeps == [BACKOFF_BASE, BACKOFF_BASE * 2]
+
+
+def test_backoff_is_capped(sleeps, monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_ATTEMPTS", 10)
+    request = FakeRequest(failures=9)
+    asyncio.run(RequestGuard().async_call(request))
+    assert max(sleeps) == BACKOFF_MAX
+    assert all(0 <= delay <= BACKOFF_MAX for delay in sleeps)
+
+
+def test_backoff_jitter_lower_bound(sleeps, monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: low)
+    asyncio.run(RequestGuard().async_call(FakeRequest(failures=2)))
+    assert sleeps == [0, 0]
+
+
+def test_non_idempotent_request_is_not_retried_on_timeout(sleeps):
+    async def request():
+        raise asyncio.TimeoutError
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(RequestGuard().async_call(request, idempotent=False))
+    assert sleeps == []
+
+
+def _open_circuit(guard):
+    async def run():
+        for _ in range(FAILURE_THRESHOLD):
+            with pytest.raises(aiohttp.ClientResponseError):
+                await guard.async_call(FakeRequest(failures=99))
+
+    asyncio.run(run())
+
+
+def test_circuit_opens_after_consecutive_failures(sleeps):
+    changes = []
+    guard = RequestGuard(on_state_change=lambda: changes.append(guard.stats.circuit_state))
+    _open_circuit(guard)
+    assert guard.stats.circuit_state == OPEN
+    assert changes == [OPEN]
+
+    request = FakeRequest()
+    with pytest.raises(CongaUnavailableError):
+        asyncio.run(guard.async_call(request))
+    assert request.calls == 0
+    assert guard.stats.short_circuited == 1
+
+
+def test_half_open_trial_closes_circuit(sleeps):
+    guard = RequestGuard()
+    _open_circuit(guard)
+    guard._opened_at -= OPEN_TIMEOUT
+
+    async def run():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def trial():
+            started.set()
+            await release.wait()
+            return "ok"
+
+        task = asyncio.ensure_future(guard.async_call(trial))
+        await started.wait()
+        assert guard.stats.circuit_state == HALF_OPEN
+        # Only the trial goes through while the circuit is half open
+        with pytest.raises(CongaUnavailableError):
+            await guard.async_call(FakeRequest())
+        release.set()
+        return await task
+
+    assert asyncio.run(run()) == "ok"
+    assert guard.stats.circuit_state == CLOSED
+
+
+def test_failed_trial_reopens_circuit_for_longer(sleeps):
+    guard = RequestGuard()
+    _open_circuit(guard)
+    guard._opened_at -= OPEN_TIMEOUT
+
+    request = FakeRequest(failures=99)
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(guard.async_call(request))
+    # The trial is not retried
+    assert request.calls == 1
+    assert guard.stats.circuit_state == OPEN
+    assert guard._open_timeout == OPEN_TIMEOUT * 2
@@ -0,0 +1,177 @@
+"""Benchmark AsyncConga against the local cloud stand-in.
+
+For every robot count a tools/mock_cloud.py server is started in its own
+process, then the client logs in, lists the robots, refreshes all their
+shadows several times and sends commands to them. Run from the repository
+root:
+
+    python -m tools.bench_cloud
+    python -m tools.bench_cloud --robots 1 10 100 --latency 0.05 --json results.json
+
+Reported figures are the refresh latency of all robots (median and 95th
+percentile), commands per second, the memory held by the client once done
+and the peak memory used while running, as measured by tracemalloc.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from tools.mock_cloud import environment
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_cloud(port, args, robots):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "tools.mock_cloud",
+            "--port",
+            str(port),
+            "--robots",
+            str(robots),
+            "--latency",
+            str(args.latency),
+            "--jitter",
+            str(args.jitter),
+            "--failure-rate",
+            str(args.failure_rate),
+            "--seed",
+            "0",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # The server prints its URL once it accepts connections
+    process.stdout.readline()
+    return process
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+async def run(args, robots):
+    # Imported once the endpoints point at the stand-in
+    from custom_components.cecotec_conga.async_conga import REQUEST_ERRORS, AsyncConga
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    client = AsyncConga("bench@example.com", "password", metrics=args.metrics)
+    client.rate_limiter.configure(args.rate_limit)
+    try:
+        start = time.perf_counter()
+        devices = await client.list_vacuums()
+        login = time.perf_counter() - start
+        sns = [device["sn"] for device in devices]
+
+        refreshes = []
+        refresh_errors = 0
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            _, errors = await client.update_all_shadows(sns)
+            refreshes.append(time.perf_counter() - start)
+            refresh_errors += len(errors)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        command_errors = 0
+
+        async def _command(index):
+            nonlocal command_errors
+            async with semaphore:
+                try:
+                    await client.set_fan_speed(sns[index % len(sns)], index % 4)
+                except REQUEST_ERRORS:
+                    command_errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_command(index) for index in range(args.commands)))
+        commands = time.perf_counter() - start
+
+        held, peak = tracemalloc.get_traced_memory()
+        return {
+            "robots": len(sns),
+            "login_ms": login * 1000,
+            "refresh_p50_ms": statistics.median(refreshes) * 1000,
+            "refresh_p95_ms": _percentile(refreshes, 95) * 1000,
+            "refresh_errors": refresh_errors,
+            "commands_per_second": args.commands / commands,
+            "command_errors": command_errors,
+            "memory_held_kib": (held - baseline) / 1024,
+            "memory_peak_kib": (peak - baseline) / 1024,
+            "stats": client.stats.as_dict(),
+            "command_stats": client.command_stats.as_dict(),
+            "shadow_stats": client.shadow_stats.as_dict(),
+            "resilience_stats": client.resilience_stats.as_dict(),
+            "rate_limit_stats": client.rate_limiter.stats.as_dict(),
+            "metrics": client.metrics.as_dict()["operations"],
+        }
+    finally:
+        await client.close()
+        tracemalloc.stop()
+
+
+def report(result):
+    print(
+        f"{result['robots']:>6} "
+        f"{result['login_ms']:>9.1f} "
+        f"{result['refresh_p50_ms']:>11.1f} "
+        f"{result['refresh_p95_ms']:>11.1f} "
+        f"{result['commands_per_second']:>10.1f} "
+        f"{result['memory_held_kib']:>9.0f} "
+        f"{result['memory_peak_kib']:>9.0f} "
+        f"{result['refresh_errors'] + result['command_errors']:>6}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--robots", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=20, help="refreshes of all robots")
+    parser.add_argument("--commands", type=int, default=200, help="commands sent")
+    parser.add_argument("--concurrency", type=int, default=8, help="commands in flight")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum random seconds added on top")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests failing")
+    parser.add_argument("--metrics", action="store_true", help="record latency histograms")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="requests per second, 0 for no limit"
+    )
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    args = parser.parse_args()
+
+    port = _free_port()
+    os.environ.update(environment(f"http://127.0.0.1:{port}"))
+
+    print(" robots  login ms  refresh p50  refresh p95  cmds/sec  held KiB  peak KiB errors")
+    results = []
+    for robots in args.robots:
+        cloud = _start_cloud(port, args, robots)
+        try:
+            result = asyncio.run(run(args, robots))
+        finally:
+            cloud.terminate()
+            cloud.wait()
+        report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark the decoding of shadow documents with large tactics.
+
+Builds a classic and a service shadow like the ones of a robot with many
+plans, then measures the time and the memory allocated per refresh for the
+ways a refresh can go. Run from the repository root:
+
+    python -m tools.bench_decode
+    python -m tools.bench_decode --plans 50 --rooms 12 --iterations 2000
+
+`baseline` decodes both documents and the tactics in them with the standard
+library on every refresh, as the client did before caching them. The other
+cases go through the client cache: `unchanged` when neither version changed,
+`classic changed` when only the classic shadow did, `classic + plans` when
+it did and plans are read, `service changed` when
+the service shadow changed but its tactics did not, and `plans changed`
+when the tactics changed and plans are read.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from custom_components.cecotec_conga import encoding
+from custom_components.cecotec_conga.conga import CongaBase
+
+SN = "CONGA000000"
+
+
+def _tactics(plans, rooms, revision=0):
+    return json.dumps(
+        {
+            "value": [
+                {
+                    "planName": f"Plan {index}",
+                    "id": index,
+                    "mapId": 1,
+                    "cleanTimes": 1 + revision,
+                    "workNoisy": 2,
+                    "water": 1,
+                    "rooms": [
+                        {
+                            "roomId": room,
+                            "name": f"Room {room}",
+                            "polygon": [[x * 17 + room, x * 23 - room] for x in range(24)],
+                        }
+                        for room in range(rooms)
+                    ],
+                }
+                for index in range(plans)
+            ]
+        }
+    )
+
+
+def _document(reported, version):
+    return json.dumps(
+        {"state": {"reported": reported}, "metadata": {}, "version": version}
+    ).encode("utf-8")
+
+
+def _classic(version):
+    return _document(
+        {"mode": "charge", "elec": 100 - version % 100, "workNoisy": 1, "water": 1},
+        version,
+    )
+
+
+def _service(version, tactics):
+    return _document({"getTimeTactics": {"body": {"timeTactics": tactics}}}, version)
+
+
+def _baseline(classic, service):
+    json.loads(classic)
+    json.loads(json.loads(service)["state"]["reported"]["getTimeTactics"]["body"]["timeTactics"])
+
+
+def _measure(name, iterations, run):
+    """Time `run(i)` over `iterations` calls, then trace the allocations of one call."""
+    start = time.perf_counter()
+    for i in range(iterations):
+        run(i)
+    elapsed = (time.perf_counter() - start) / iterations
+
+    tracemalloc.start()
+    run(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<18} {elapsed * 1e6:>10.1f} {peak / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=30, help="plans per robot")
+    parser.add_argument("--rooms", type=int, default=8, help="rooms per plan")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    tactics = [_tactics(args.plans, args.rooms, revision) for revision in range(2)]
+    service = _service(1, tactics[0])
+    print(f"service shadow of {len(service) / 1024:.0f} KiB, JSON backend: "
+          f"{'orjson' if encoding.orjson is not None else 'json'}")
+    print(f"{'case':<18} {'us/refresh':>10} {'peak KiB':>10}")
+
+    classic = _classic(1)
+    _measure("baseline", args.iterations, lambda i: _baseline(classic, service))
+
+    client = CongaBase("bench", "bench")
+    client._store_shadows(SN, classic, service)
+    client.list_plans(SN)
+    _measure("unchanged", args.iterations, lambda i: client._store_shadows(SN, classic, service))
+
+    classics = [_classic(version) for version in range(2, args.iterations + 3)]
+    _measure(
+        "classic changed",
+        args.iterations,
+        lambda i: client._store_shadows(SN, classics[i], service),
+    )
+
+    classics_plans = [
+        _classic(version) for version in range(args.iterations + 3, 2 * args.iterations + 4)
+    ]
+
+    def _classic_plans(i):
+        client._store_shadows(SN, classics_plans[i], service)
+        client.list_plans(SN)
+
+    _measure("classic + plans", args.iterations, _classic_plans)
+
+    services = [_service(version, tactics[0]) for version in range(2, args.iterations + 3)]
+
+    def _service_changed(i):
+        client._store_shadows(SN, classic, services[i])
+        client.list_plans(SN)
+
+    _measure("service changed", args.iterations, _service_changed)
+
+    changed = [
+        _service(version, tactics[version % 2])
+        for version in range(args.iterations + 3, 2 * args.iterations + 4)
+    ]
+
+    def _plans_changed(i):
+        client._store_shadows(SN, classic, changed[i])
+        client.list_plans(SN)
+
+    _measure("plans changed", args.iterations, _plans_changed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure the time and memory needed to import the integration.
+
+Each measurement runs in a fresh interpreter that first imports the Home
+Assistant modules any integration gets for free, so only the cost added by
+this integration is reported. Run from the repository root:
+
+    python -m tools.bench_import
+    python -m tools.bench_import --compare HEAD~1
+
+`--compare` measures a git revision too, extracted in a temporary directory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODULES = [
+    "custom_components.cecotec_conga",
+    "custom_components.cecotec_conga.config_flow",
+]
+PRELOADED = [
+    "aiohttp",
+    "voluptuous",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.aiohttp_client",
+    "homeassistant.helpers.storage",
+    "homeassistant.helpers.update_coordinator",
+]
+HEAVY = ["boto3", "botocore", "pycognito", "requests", "paho"]
+
+_PROBE = """
+import importlib, json, resource, sys, time
+for name in {preloaded!r}:
+    importlib.import_module(name)
+heavy_before = {{m for m in {heavy!r} if m in sys.modules}}
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+    "heavy": sorted(m for m in {heavy!r} if m in sys.modules and m not in heavy_before),
+}}))
+"""
+
+
+def measure(root, runs):
+    code = _PROBE.format(preloaded=PRELOADED, heavy=HEAVY, modules=MODULES)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=root,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output))
+    results.sort(key=lambda result: result["seconds"])
+    return results[len(results) // 2]
+
+
+def report(label, result):
+    print(
+        f"{label:>10}: {result['seconds'] * 1000:8.1f} ms  "
+        f"{result['rss_kb'] / 1024:6.1f} MiB  "
+        f"heavy modules: {', '.join(result['heavy']) or 'none'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="runs per revision, the median is shown")
+    parser.add_argument("--compare", metavar="REV", help="git revision to compare with")
+    args = parser.parse_args()
+
+    root = os.getcwd()
+    report("current", measure(root, args.runs))
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = subprocess.run(
+                ["git", "archive", args.compare, "custom_components"],
+                cwd=root,
+                check=True,
+                capture_output=True,
+            ).stdout
+            subprocess.run(["tar", "-x", "-C", tmp], input=archive, check=True)
+            report(args.compare, measure(tmp, args.runs))
+
+
+if __name__ == "__main__":
+    main()
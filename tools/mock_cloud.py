@@ -0,0 +1,314 @@
+"""Local stand-in for the Conga cloud.
+
+Serves the Cecotec device list, the Cognito user pool and identity pool
+requests used by the token manager, and the IoT Data shadow endpoints for
+a set of simulated robots. Every request can be delayed and made to fail
+at random to exercise retries and timeouts. Run from the repository root:
+
+    python -m tools.mock_cloud --robots 10 --latency 0.05 --failure-rate 0.01
+
+and point the integration at it with the environment variables printed at
+startup. Signatures and passwords are not checked, any account logs in.
+
+Robots react to the commands sent to their shadows: cleaning commands make
+them sweep and return home commands send them back to charge. Their
+reported state can be changed with `POST /mock/things/{sn}/shadow`, with the
+same body and `name` query parameter as a shadow update, and robots can be
+added with `POST /mock/robots` (`{"sn": ..., "note_name": ...}`) or removed
+with `DELETE /mock/robots/{sn}`.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+AWS_REGION = "eu-west-2"
+# Seconds the tokens and credentials handed out stay valid
+TOKEN_TTL = 3600
+
+DEFAULT_PLANS = ["Kitchen", "Living room", "Bedrooms"]
+
+
+def _tactics(plan_names):
+    return json.dumps(
+        {
+            "value": [
+                {"planName": name, "id": index, "mapId": 1, "cleanTimes": 1}
+                for index, name in enumerate(plan_names)
+            ]
+        }
+    )
+
+
+class MockRobot:
+    """Shadows of a simulated robot."""
+
+    def __init__(self, sn, note_name, plan_names=DEFAULT_PLANS):
+        self.sn = sn
+        self.note_name = note_name
+        self.shadows = {
+            None: {
+                "mode": "charge",
+                "elec": 100,
+                "workNoisy": 1,
+                "water": 1,
+                "cleanArea": 0,
+                "allArea": 0,
+                "cleanTime": 0,
+                "allTime": 0,
+                "connected": True,
+            },
+            "service": {
+                "getTimeTactics": {"body": {"timeTactics": _tactics(plan_names)}},
+            },
+        }
+        self.versions = {None: 1, "service": 1}
+        self.timestamps = {None: int(time.time()), "service": int(time.time())}
+
+    def device(self):
+        return {"sn": self.sn, "note_name": self.note_name, "device_type": "5290"}
+
+    def document(self, shadow_name):
+        return {
+            "state": {"reported": self.shadows[shadow_name]},
+            "metadata": {},
+            "version": self.versions[shadow_name],
+            "timestamp": self.timestamps[shadow_name],
+        }
+
+    def report(self, shadow_name, reported):
+        self.shadows[shadow_name].update(reported)
+        self.versions[shadow_name] += 1
+        self.timestamps[shadow_name] = int(time.time())
+
+    def apply(self, shadow_name, desired):
+        """Update the reported state as the robot would after a command."""
+        reported = {}
+        if "startClean" in desired or "StartTimedCleanTask" in desired:
+            reported["mode"] = "sweep"
+        if "startFindCharge" in desired:
+            reported["mode"] = "backcharge"
+        for key in ("workNoisy", "water"):
+            if key in desired:
+                reported[key] = desired[key]
+        if reported:
+            self.report(None, reported)
+        if shadow_name is not None and shadow_name != "service":
+            self.report(shadow_name, desired)
+
+
+class MockCloud:
+    """aiohttp application simulating the Conga cloud for `robots` robots.
+
+    `latency` seconds plus up to `jitter` seconds are waited before every
+    response, and a `failure_rate` fraction of the requests fail with a 503.
+    """
+
+    def __init__(self, robots=1, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self.robots = {}
+        self._random = random.Random(seed)
+        for index in range(robots):
+            self.add_robot(f"CONGA{index:06d}", f"Conga {index + 1}")
+
+    def add_robot(self, sn, note_name, plan_names=DEFAULT_PLANS):
+        self.robots[sn] = MockRobot(sn, note_name, plan_names)
+        return self.robots[sn]
+
+    def remove_robot(self, sn):
+        self.robots.pop(sn, None)
+
+    def app(self):
+        app = web.Application(middlewares=[self._inject_faults])
+        app.router.add_post("/", self._cognito)
+        app.router.add_post("/api/user_machine/list", self._list_machines)
+        app.router.add_get("/things/{sn}/shadow", self._get_shadow)
+        app.router.add_post("/things/{sn}/shadow", self._update_shadow)
+        app.router.add_post("/mock/things/{sn}/shadow", self._report_shadow)
+        app.router.add_post("/mock/robots", self._add_robot)
+        app.router.add_delete("/mock/robots/{sn}", self._remove_robot)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Serve the application and return its runner and base URL."""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{port}"
+
+    @web.middleware
+    async def _inject_faults(self, request, handler):
+        if request.path.startswith("/mock/"):
+            return await handler(request)
+        self.requests += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            self.failures += 1
+            return web.json_response({"message": "Injected failure"}, status=503)
+        return await handler(request)
+
+    async def _cognito(self, request):
+        target = request.headers.get("X-Amz-Target", "").rsplit(".", 1)[-1]
+        payload = await request.json()
+        handler = {
+            "InitiateAuth": self._initiate_auth,
+            "RespondToAuthChallenge": self._respond_to_auth_challenge,
+            "GetId": self._get_id,
+            "GetCredentialsForIdentity": self._get_credentials_for_identity,
+        }.get(target)
+        if handler is None:
+            return _aws_error("UnknownOperationException", f"Unknown target {target}")
+        return web.json_response(handler(payload))
+
+    def _initiate_auth(self, payload):
+        parameters = payload["AuthParameters"]
+        if payload["AuthFlow"] == "REFRESH_TOKEN_AUTH":
+            return {"AuthenticationResult": self._tokens(refresh=False)}
+        return {
+            "ChallengeName": "PASSWORD_VERIFIER",
+            "ChallengeParameters": {
+                "SALT": os.urandom(16).hex(),
+                "SRP_B": os.urandom(384).hex(),
+                "SECRET_BLOCK": base64.standard_b64encode(os.urandom(64)).decode(),
+                "USER_ID_FOR_SRP": parameters["USERNAME"],
+                "USERNAME": parameters["USERNAME"],
+            },
+        }
+
+    def _respond_to_auth_challenge(self, payload):
+        return {"AuthenticationResult": self._tokens(refresh=True)}
+
+    def _get_id(self, payload):
+        return {"IdentityId": f"{AWS_REGION}:{uuid.uuid4()}"}
+
+    def _get_credentials_for_identity(self, payload):
+        return {
+            "IdentityId": payload["IdentityId"],
+            "Credentials": {
+                "AccessKeyId": "ASIAMOCK",
+                "SecretKey": uuid.uuid4().hex,
+                "SessionToken": uuid.uuid4().hex,
+                "Expiration": time.time() + TOKEN_TTL,
+            },
+        }
+
+    @staticmethod
+    def _tokens(refresh):
+        tokens = {
+            "IdToken": uuid.uuid4().hex,
+            "AccessToken": uuid.uuid4().hex,
+            "ExpiresIn": TOKEN_TTL,
+            "TokenType": "Bearer",
+        }
+        if refresh:
+            tokens["RefreshToken"] = uuid.uuid4().hex
+        return tokens
+
+    async def _list_machines(self, request):
+        if "Authorization" not in request.headers:
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        devices = [robot.device() for robot in self.robots.values()]
+        return web.json_response({"data": {"page_items": devices}})
+
+    def _robot(self, request):
+        if not request.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256"):
+            raise web.HTTPForbidden()
+        robot = self.robots.get(request.match_info["sn"])
+        if robot is None:
+            raise web.HTTPNotFound()
+        return robot, request.query.get("name")
+
+    async def _get_shadow(self, request):
+        robot, shadow_name = self._robot(request)
+        if shadow_name not in robot.shadows:
+            raise web.HTTPNotFound()
+        return web.json_response(robot.document(shadow_name))
+
+    async def _update_shadow(self, request):
+        robot, shadow_name = self._robot(request)
+        desired = (await request.json())["state"]["desired"]
+        robot.apply(shadow_name, desired)
+        return web.json_response(
+            {
+                "state": {"desired": desired},
+                "metadata": {},
+                "version": robot.versions.get(shadow_name, 1),
+                "timestamp": int(time.time()),
+            }
+        )
+
+    async def _report_shadow(self, request):
+        robot = self.robots.get(request.match_info["sn"])
+        if robot is None:
+            raise web.HTTPNotFound()
+        shadow_name = request.query.get("name")
+        robot.shadows.setdefault(shadow_name, {})
+        robot.versions.setdefault(shadow_name, 0)
+        robot.report(shadow_name, (await request.json())["state"]["reported"])
+        return web.json_response(robot.document(shadow_name))
+
+    async def _add_robot(self, request):
+        device = await request.json()
+        robot = self.add_robot(device["sn"], device.get("note_name", device["sn"]))
+        return web.json_response(robot.device())
+
+    async def _remove_robot(self, request):
+        self.remove_robot(request.match_info["sn"])
+        return web.json_response({})
+
+
+def _aws_error(error_type, message):
+    return web.json_response({"__type": error_type, "message": message}, status=400)
+
+
+def environment(url):
+    """Return the environment variables pointing the clients at `url`."""
+    return {
+        "CECOTEC_API_BASE_URL": url,
+        "AWS_IOT_ENDPOINT": url,
+        "COGNITO_IDP_URL": f"{url}/",
+        "COGNITO_IDENTITY_URL": f"{url}/",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--robots", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum random seconds added on top")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests failing")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    cloud = MockCloud(args.robots, args.latency, args.jitter, args.failure_rate, args.seed)
+    runner, url = await cloud.start(args.host, args.port)
+    print(f"Serving {args.robots} robots on {url}", flush=True)
+    for name, value in environment(url).items():
+        print(f"export {name}={value}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,67 @@
+"""Exercise CongaPushClient against a local MQTT broker stand-in.
+
+Start a broker listening for MQTT over websockets (`make test-push` runs
+mosquitto with tools/mosquitto.conf), then run from the repository root:
+
+    python -m tools.push_stand_in
+"""
+import asyncio
+import json
+import os
+from urllib.parse import urlsplit
+
+import paho.mqtt.publish as publish
+
+from custom_components.cecotec_conga.push import CongaPushClient, NAMED_SHADOW_TOPIC, SHADOW_TOPIC
+
+BROKER_URL = os.environ.get("CONGA_MQTT_URL", "ws://localhost:9001/mqtt")
+SN = "STANDIN0001"
+
+
+def _document(reported):
+    return json.dumps({"current": {"state": {"reported": reported}, "version": 1}})
+
+
+async def main():
+    received = asyncio.Queue()
+    client = CongaPushClient(
+        None, [SN], lambda *update: received.put_nowait(update[:3]), endpoint=BROKER_URL
+    )
+    await client.async_start()
+    for _ in range(50):
+        if client.connected:
+            break
+        await asyncio.sleep(0.1)
+    # Give the broker time to register the subscriptions
+    await asyncio.sleep(0.5)
+
+    broker = urlsplit(BROKER_URL)
+    messages = [
+        (SHADOW_TOPIC.format(sn=SN), _document({"mode": "sweep", "elec": 87})),
+        (
+            NAMED_SHADOW_TOPIC.format(sn=SN, name="service"),
+            _document({"getTimeTactics": {"body": {"timeTactics": '{"value": []}'}}}),
+        ),
+    ]
+    await asyncio.get_running_loop().run_in_executor(
+        None,
+        lambda: publish.multiple(
+            [{"topic": topic, "payload": payload, "qos": 1} for topic, payload in messages],
+            hostname=broker.hostname,
+            port=broker.port,
+            transport="websockets",
+        ),
+    )
+
+    try:
+        for expected in [None, "service"]:
+            sn, shadow_name, reported = await asyncio.wait_for(received.get(), 10)
+            print(f"Received {shadow_name or 'classic'} shadow for {sn}: {reported}")
+            assert sn == SN and shadow_name == expected
+    finally:
+        await client.async_stop()
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())